@@ -9,10 +9,13 @@ import secrets
 import time
 import atexit
 import contextlib
+import functools
 import io
+import mmap
 import re
 import signal
-from dataclasses import dataclass
+import threading
+from dataclasses import asdict, dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
@@ -20,6 +23,25 @@ from typing import Any, Dict, Optional
 import pyte
 import pyte.modes
 
+try:
+    # Optional SIMD base64 codec (same API); every PTY chunk and marker goes through base64.
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+try:
+    # Optional RE2 (linear-time) engine for user-supplied wait_for regexes.
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+try:
+    # Optional faster JSON codec for the per-line event/index appends and index scans.
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+_json_loads = _orjson.loads if _orjson is not None else json.loads
+
 
 def _ensure_framework_shells_secret() -> None:
     """Derive a stable secret from cwd/repo root if not already set."""
@@ -66,51 +88,57 @@ def _conversation_dir() -> Path:
 
 def _b64decode(s: str) -> str:
     try:
-        return base64.b64decode(s.encode("ascii"), validate=False).decode("utf-8", errors="replace")
+        return _b64.b64decode(s, validate=False).decode("utf-8", errors="replace")
     except Exception:
         return ""
 
 
+# Regex matches can be any length; re-scan this much of the previous window on each check.
+_WAIT_REGEX_OVERLAP = 4096
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_wait_regex(pattern: str) -> Any:
+    """Compile (and cache) a wait_for regex, preferring RE2 when installed."""
+    try:
+        return _re_engine.compile(pattern)
+    except Exception:
+        # RE2 rejects backreferences/lookaround; those still work with the stdlib engine.
+        return re.compile(pattern)
+
+
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
+def _jsonl(payload: Dict[str, Any]) -> bytes:
+    """Encode one JSONL record (trailing newline included)."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(payload, option=_orjson.OPT_APPEND_NEWLINE | _orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. ints past 64 bits; the stdlib encoder handles those
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
 def _agent_pty_root(conversation_id: str) -> Path:
     safe = "".join(ch for ch in conversation_id if ch.isalnum() or ch in ("-", "_"))
     return _conversation_dir() / safe / "agent_pty"
 
 
-def _blocks_dir(conversation_id: str) -> Path:
-    return _agent_pty_root(conversation_id) / "blocks"
-
-
 def _blocks_index_path(conversation_id: str) -> Path:
     return _agent_pty_root(conversation_id) / "blocks.jsonl"
 
 
-def _blocks_events_path(conversation_id: str) -> Path:
-    return _agent_pty_root(conversation_id) / "events.jsonl"
-
-
 def _rcfile_path(conversation_id: str) -> Path:
     return _agent_pty_root(conversation_id) / "bashrc_agent_pty.sh"
 
-def _marker_path(conversation_id: str) -> Path:
-    return _agent_pty_root(conversation_id) / "markers.log"
-
 
 # Sprint 2: Screen model paths
 def _screen_events_path(conversation_id: str) -> Path:
     return _agent_pty_root(conversation_id) / "screen.jsonl"
 
 
-def _screen_size_path(conversation_id: str) -> Path:
-    return _agent_pty_root(conversation_id) / "screen_size.json"
-
-
-def _shell_id_path(conversation_id: str) -> Path:
-    return _agent_pty_root(conversation_id) / "shell_id.txt"
-
 def _shell_manager_registry_path() -> Path:
     return Path(os.path.expanduser("~/.cache/app_server/shell_manager.json"))
 
@@ -230,6 +258,11 @@ def _shell_manager_request_sync(path: str, payload: Dict[str, Any], *, timeout_s
 
 _MARKER_BEGIN = "__FWS_BLOCK_BEGIN__"
 _MARKER_END = "__FWS_BLOCK_END__"
+# Fixed-shape marker lines emitted by the rcfile / exec wrapper (fields may be empty).
+_MARKER_BEGIN_RE = re.compile(
+    r"__FWS_BLOCK_BEGIN__ seq=(?P<seq>\d*) ts=(?P<ts>\d*) cwd_b64=(?P<cwd>\S*) cmd_b64=(?P<cmd>\S*)"
+)
+_MARKER_END_RE = re.compile(r"__FWS_BLOCK_END__ seq=(?P<seq>\d*) ts=(?P<ts>\d*) exit=(?P<exit>-?\d+)")
 
 
 def _write_rcfile(path: Path, marker_path: Path) -> None:
@@ -270,7 +303,8 @@ __FWS_IN_MARKER=0
 __FWS_READY=0
 __FWS_MANUAL="${__FWS_MANUAL:-0}"
 
-__fws_b64() { printf %s "$1" | base64 | tr -d '\n'; }
+# GNU/toybox base64 can disable wrapping itself (-w0); keep the tr pipeline for BSD base64.
+__fws_b64() { printf %s "$1" | base64 -w0 2>/dev/null || printf %s "$1" | base64 | tr -d '\n'; }
 __fws_now_ms() {
   date +%s%3N 2>/dev/null && return 0
   python - <<'PY'
@@ -278,6 +312,15 @@ import time
 print(int(time.time() * 1000))
 PY
 }
+# Fork-free timestamp: sets __FWS_NOW_MS from bash 5's $EPOCHREALTIME (falls back to __fws_now_ms).
+__fws_stamp_ms() {
+  if [ -n "${EPOCHREALTIME:-}" ]; then
+    local t="${EPOCHREALTIME/[.,]/}"
+    __FWS_NOW_MS="${t%???}"
+  else
+    __FWS_NOW_MS="$(__fws_now_ms)"
+  fi
+}
 
 __fws_emit_begin() {
   local cmd="$1"
@@ -298,20 +341,20 @@ __fws_emit_end() {
 
 __fws_emit_prompt() {
   local exit_code="${1:-$?}"
-  local ts="$(__fws_now_ms)"
+  __fws_stamp_ms
+  local ts="$__FWS_NOW_MS"
   local cwd="$(pwd -P 2>/dev/null || pwd)"
   local cwd_b64="$(__fws_b64 "$cwd")"
   printf '\n__FWS_PROMPT__ ts=%s cwd_b64=%s exit=%s\n' "$ts" "$cwd_b64" "$exit_code" >&3
 }
 
 __fws_should_ignore_cmd() {
-  local cmd="$1"
-  case "$cmd" in
-    PS1=*|PROMPT_COMMAND=*|__FWS_READY=*|__FWS_SEQ=*|__FWS_LAST_SEQ=*|__FWS_IN_MARKER=*|trap*|shopt*|set\ +o*|set\ -o*)
-      return 0
-      ;;
-    *__FWS_BLOCK_BEGIN__*|*__FWS_BLOCK_END__*|*__FWS_PROMPT__*) return 0 ;;
+  # Runs from the DEBUG trap for every command: test the most common internal noise first.
+  # (__FWS_* also covers the __FWS_READY=/__FWS_SEQ=/__FWS_IN_MARKER= assignments.)
+  case "$1" in
     __fws_*|__FWS_*) return 0 ;;
+    *__FWS_BLOCK_BEGIN__*|*__FWS_BLOCK_END__*|*__FWS_PROMPT__*) return 0 ;;
+    PS1=*|PROMPT_COMMAND=*|trap*|shopt*|set\ +o*|set\ -o*) return 0 ;;
   esac
   return 1
 }
@@ -340,7 +383,8 @@ else
     __FWS_IN_MARKER=1
     __FWS_SEQ=$((__FWS_SEQ + 1))
     __FWS_LAST_SEQ="$__FWS_SEQ"
-    local ts="$(__fws_now_ms)"
+    __fws_stamp_ms
+    local ts="$__FWS_NOW_MS"
     local cwd="$(pwd -P 2>/dev/null || pwd)"
     __fws_emit_begin "$cmd" "$cwd" "$ts" "$__FWS_SEQ"
     __FWS_IN_MARKER=0
@@ -359,7 +403,8 @@ else
     fi
     __FWS_IN_MARKER=1
     local exit_code="$?"
-    local ts="$(__fws_now_ms)"
+    __fws_stamp_ms
+    local ts="$__FWS_NOW_MS"
     __fws_emit_end "$exit_code" "$ts" "$__FWS_LAST_SEQ"
     __FWS_LAST_SEQ=""
     __FWS_IN_MARKER=0
@@ -372,7 +417,16 @@ fi
 PS1="agent-pty> "
 """
     content = content.replace("__FWS_MARKER_FILE_PATH__", str(marker_path))
-    path.write_text(content.lstrip(), encoding="utf-8")
+    data = content.lstrip().encode("utf-8")
+    # Restarts re-run ensure for the same conversation; leave an identical rcfile alone.
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return
+    except OSError:
+        pass
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
 
 
 def _termux_env_overrides() -> Dict[str, str]:
@@ -390,7 +444,7 @@ def _termux_env_overrides() -> Dict[str, str]:
     return env
 
 
-@dataclass
+@dataclass(slots=True)
 class BlockInfo:
     block_id: str
     conversation_id: str
@@ -404,28 +458,138 @@ class BlockInfo:
     output_path: Optional[str] = None
 
 
-def _output_spool_path(conversation_id: str) -> Path:
-    """Canonical output spool for wait_for cursor operations."""
-    return _agent_pty_root(conversation_id) / "output.spool"
+class _AppendWriter:
+    """Single-task appender for one file.
 
-def _raw_events_path(conversation_id: str) -> Path:
-    """Raw chunk event stream for UI playback (base64 bytes)."""
-    return _agent_pty_root(conversation_id) / "raw_events.jsonl"
+    Callers queue bytes and await their flush. Everything queued while a write is
+    in flight is coalesced into the next os.write() on a cached O_APPEND fd, so a
+    burst of chunks costs one thread hop instead of an open/write/close each.
+    """
 
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.pending: int = 0  # bytes queued but not yet on disk
+        self._fd: Optional[int] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._busy: bool = False
+        self._closing: bool = False
+
+    async def append(self, data: bytes) -> None:
+        if not data:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=f"agent-pty-append:{self.path.name}")
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.pending += len(data)
+        self._queue.put_nowait((data, fut))
+        await fut
+
+    def _write(self, data: bytes) -> None:
+        # Reopen if the file was removed underneath us (writes would go to an orphan inode).
+        if self._fd is not None and os.fstat(self._fd).st_nlink == 0:
+            os.close(self._fd)
+            self._fd = None
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            self._busy = True
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            data = b"".join(item[0] for item in batch)
+            err: Optional[BaseException] = None
+            try:
+                await asyncio.to_thread(self._write, data)
+            except Exception as e:
+                err = e
+            self.pending -= len(data)
+            for _, fut in batch:
+                if fut.done():
+                    continue
+                if err is not None:
+                    fut.set_exception(err)
+                else:
+                    fut.set_result(None)
+            self._busy = False
+            if self._closing and self._queue.empty():
+                self._release_fd()
+                return
+
+    def close(self) -> None:
+        """Release the fd once queued appends are on disk (never drops data)."""
+        self._closing = True
+        if self._task is None or self._task.done():
+            self._release_fd()
+        elif not self._busy and self._queue.empty():
+            self._task.cancel()
+            self._release_fd()
+
+    def _release_fd(self) -> None:
+        if self._fd is not None:
+            with contextlib.suppress(OSError):
+                os.close(self._fd)
+            self._fd = None
+
+
+# How long exec() keeps the PTY marked busy waiting for its BEGIN marker.
+_BEGIN_MARKER_TIMEOUT_S = 3.0
+# Longest partial output line carried between chunks before it is force-emitted.
+_LINE_BUFFER_MAX = 1024 * 1024
+# Output lines are batched into one agent_block_delta event per tick (or per this many chars).
+_DELTA_FLUSH_INTERVAL_S = 0.01
+_DELTA_FLUSH_BYTES = 64 * 1024
 
 _MARKER_PROMPT = "__FWS_PROMPT__"
+_MARKER_PROMPT_RE = re.compile(r"__FWS_PROMPT__ ts=(?P<ts>\d*) cwd_b64=(?P<cwd>\S*) exit=(?P<exit>-?\d+)")
+# One scan per line to find which marker (if any) is present.
+_MARKER_ANY_RE = re.compile("|".join(re.escape(m) for m in (_MARKER_BEGIN, _MARKER_END, _MARKER_PROMPT)))
+# Anything the user-terminal sanitizer may need to drop (wrapper echo or markers).
+_TERMINAL_NOISE_RE = re.compile("__fws_cmd|" + _MARKER_ANY_RE.pattern)
 
 
 class ConversationState:
+    # Fixed attribute set (long-lived, touched on every output chunk); keep in sync with __init__.
+    __slots__ = (
+        "conversation_id", "_root", "_blocks_dir", "_events_path", "_index_path", "lock",
+        "_raw_lock", "shell_id", "_reader_task", "_buffer", "_active", "_active_out",
+        "_pending_block", "_pending_timer", "_bg_tasks", "_last_seq", "_raw_chunk_callbacks", "_mode", "_interactive_session_id", "_spool_lock",
+        "_spool_path", "_spool_size", "_writers", "_read_fds", "_read_fds_lock", "_waiters", "_screen_main", "_stream_main",
+        "_screen_alt", "_stream_alt", "_in_alt_screen", "_ansi_mode_buf", "_screen_cols",
+        "_screen_rows", "_pending_dirty_rows", "_screen_size_loaded", "_scrollback_limit",
+        "_raw_path", "_raw_size", "_screen_raw_size", "_bytes_queue", "_bytes_reader_task",
+        "_marker_path", "_marker_task", "_marker_buffer", "_screen_lock", "_scrollback_path",
+        "_scrollback_size", "_scrollback_line_count", "_last_scrollback_sync",
+        "_last_screen_delta_ts", "_screen_delta_min_interval", "_screen_delta_task",
+        "_last_pty_resize_size", "_delta_block_id", "_delta_parts", "_delta_size", "_delta_flush_task",
+    )
+
     def __init__(self, conversation_id: str) -> None:
         self.conversation_id = conversation_id
+        # On-disk layout, resolved once (the per-line hot paths used to rebuild these per call)
+        self._root = _agent_pty_root(conversation_id)
+        self._blocks_dir = self._root / "blocks"
+        self._events_path = self._root / "events.jsonl"
+        self._index_path = self._root / "blocks.jsonl"
         self.lock = asyncio.Lock()
         self._raw_lock = asyncio.Lock()
         self.shell_id: Optional[str] = None
         self._reader_task: Optional[asyncio.Task] = None
-        self._buffer = ""
+        self._buffer = bytearray()  # partial line carried between output chunks
         self._active: Optional[BlockInfo] = None
-        self._begin_waiter: Optional[asyncio.Future] = None
+        # Path form of _active.output_path, built once per block (used per output line).
+        self._active_out: Optional[Path] = None
+        # Block announced by exec() whose BEGIN marker has not been read yet.
+        self._pending_block: Optional[BlockInfo] = None
+        self._pending_timer: Optional[asyncio.TimerHandle] = None  # begin-marker timeout
+        self._bg_tasks: set = set()  # fire-and-forget tasks, referenced until done
+        self._last_seq: Optional[int] = None  # last block seq handed out (lazy from the index)
         self._raw_chunk_callbacks: list = []  # List of async callbacks for raw chunks
         # Mode: 'idle', 'block_running', 'interactive'
         self._mode: str = "idle"
@@ -434,8 +598,19 @@ class ConversationState:
         self._spool_lock = asyncio.Lock()
         self._spool_path: Optional[Path] = None
         self._spool_size: int = 0
-        # Waiters for wait_for - list of (condition_fn, future, from_cursor)
-        self._waiters: list = []
+        # Per-file coalescing appenders (spool, raw, events, screen, block index/output)
+        self._writers: Dict[Path, _AppendWriter] = {}
+        self._read_fds: Dict[Path, int] = {}  # cached O_RDONLY fds for spool/raw reads
+        # Held across lookup + pread (reads run in worker threads) so an fd is never closed mid-read.
+        self._read_fds_lock = threading.Lock()
+        # agent_block_delta coalescing: lines buffered for one block, flushed per tick or size cap
+        self._delta_block_id: Optional[str] = None
+        self._delta_parts: list = []
+        self._delta_size: int = 0
+        self._delta_flush_task: Optional[asyncio.Task] = None
+        # Waiters for wait_for - future -> [match_fn, from_cursor, match_type, scan_cursor, overlap]
+        # (keyed by future for O(1) removal; value mutable so scan_cursor advances in place)
+        self._waiters: Dict[asyncio.Future, list] = {}
         
         # === Sprint 1: Screen model (pyte) ===
         # We keep two screen models to represent primary + alternate screen buffers.
@@ -490,7 +665,7 @@ class ConversationState:
         if self._screen_size_loaded:
             return
         self._screen_size_loaded = True
-        path = _screen_size_path(self.conversation_id)
+        path = self._root / "screen_size.json"
         if not path.exists():
             return
         try:
@@ -506,7 +681,7 @@ class ConversationState:
 
     async def _save_persisted_screen_size(self) -> None:
         """Best-effort persist of current screen size for this conversation."""
-        path = _screen_size_path(self.conversation_id)
+        path = self._root / "screen_size.json"
         path.parent.mkdir(parents=True, exist_ok=True)
         payload = {"cols": int(self._screen_cols), "rows": int(self._screen_rows), "ts": _now_ms()}
         try:
@@ -563,12 +738,7 @@ class ConversationState:
         if not chunk:
             return ""
         # Fast path: if nothing relevant is present, return as-is.
-        if (
-            "__fws_cmd" not in chunk
-            and _MARKER_BEGIN not in chunk
-            and _MARKER_END not in chunk
-            and _MARKER_PROMPT not in chunk
-        ):
+        if _TERMINAL_NOISE_RE.search(chunk) is None:
             return chunk
         # Remove whole lines that contain wrapper/marker noise.
         #
@@ -594,69 +764,102 @@ class ConversationState:
     async def _init_spool(self) -> None:
         """Initialize or open the output spool file."""
         if self._spool_path is None:
-            self._spool_path = _output_spool_path(self.conversation_id)
+            self._spool_path = self._root / "output.spool"
             self._spool_path.parent.mkdir(parents=True, exist_ok=True)
             if not self._spool_path.exists():
                 self._spool_path.write_bytes(b"")
         # Always refresh from disk: multiple processes can append to the same spool.
+        # This is the single place the size is re-read; callers must not stat() it themselves.
+        # Our own queued/in-flight bytes already own a cursor range but may not be on disk yet,
+        # so never move the logical end backwards.
         try:
-            self._spool_size = self._spool_path.stat().st_size
+            self._spool_size = max(self._spool_path.stat().st_size, self._spool_size)
         except Exception:
             pass
 
+    def _writer(self, path: Path) -> _AppendWriter:
+        writer = self._writers.get(path)
+        if writer is None:
+            writer = _AppendWriter(path)
+            self._writers[path] = writer
+        return writer
+
+    def _close_writer(self, path: Optional[Path]) -> None:
+        writer = self._writers.pop(path, None) if path is not None else None
+        if writer is not None:
+            writer.close()
+
     async def _append_spool(self, data: str) -> int:
         """Append to spool, return new size (cursor position)."""
+        # Normalize to \n for storage
+        normalized = data.replace("\r\n", "\n").replace("\r", "\n")
+        encoded = normalized.encode("utf-8", errors="replace")
         async with self._spool_lock:
             await self._init_spool()
-            # Normalize to \n for storage
-            normalized = data.replace("\r\n", "\n").replace("\r", "\n")
-            encoded = normalized.encode("utf-8", errors="replace")
-            await asyncio.to_thread(self._append_bytes, self._spool_path, encoded)
             self._spool_size += len(encoded)
-            return self._spool_size
-
-    @staticmethod
-    def _append_bytes(path: Path, data: bytes) -> None:
-        with path.open("ab") as f:
-            f.write(data)
+            size = self._spool_size
+            writer = self._writer(self._spool_path)
+        # Await outside the lock so concurrent appenders coalesce into one write.
+        await writer.append(encoded)
+        return size
 
     async def read_spool(self, from_cursor: int = 0, max_bytes: int = 65536) -> tuple:
         """Read spool from cursor, returns (data, next_cursor)."""
+        data, next_cursor = await self._read_spool_bytes(from_cursor, max_bytes)
+        return (data.decode("utf-8", errors="replace"), next_cursor)
+
+    async def _read_spool_bytes(self, from_cursor: int = 0, max_bytes: int = 65536) -> tuple:
+        """Read raw spool bytes from cursor, returns (data, next_cursor)."""
         async with self._spool_lock:
             await self._init_spool()
             from_cursor = max(0, int(from_cursor))
-            # Refresh size under lock (external writers may have appended).
-            try:
-                self._spool_size = self._spool_path.stat().st_size
-            except Exception:
-                pass
             if from_cursor >= self._spool_size:
-                return ("", self._spool_size)
+                return (b"", self._spool_size)
             data = await asyncio.to_thread(self._read_bytes, self._spool_path, from_cursor, max_bytes)
-            return (data.decode("utf-8", errors="replace"), from_cursor + len(data))
-
-    @staticmethod
-    def _read_bytes(path: Path, offset: int, max_bytes: int) -> bytes:
-        with path.open("rb") as f:
-            f.seek(offset)
-            return f.read(max_bytes)
+            return (data, from_cursor + len(data))
+
+    def _read_bytes(self, path: Path, offset: int, max_bytes: int) -> bytes:
+        # One pread on a cached read-only fd instead of open/seek/read/close per scan.
+        with self._read_fds_lock:
+            fd = self._read_fds.get(path)
+            if fd is not None and os.fstat(fd).st_nlink == 0:
+                # File was removed/replaced underneath us; reopen by path.
+                self._read_fds.pop(path, None)
+                os.close(fd)
+                fd = None
+            if fd is None:
+                fd = os.open(str(path), os.O_RDONLY)
+                self._read_fds[path] = fd
+            return os.pread(fd, max_bytes, offset)
+
+    def _close_read_fds(self) -> None:
+        with self._read_fds_lock:
+            fds = list(self._read_fds.values())
+            self._read_fds.clear()
+            for fd in fds:
+                with contextlib.suppress(OSError):
+                    os.close(fd)
 
     async def _check_waiters(self, new_data: str) -> None:
         """Check if any waiters match the new data."""
         if not self._waiters:
             return
-        # Read recent spool data for matching
-        resolved = []
-        for i, (match_fn, future, from_cursor, match_type) in enumerate(self._waiters):
+        # Only scan spool bytes not yet seen by each waiter, re-reading `overlap` bytes
+        # so a match straddling the previous scan boundary is still found.
+        for future, waiter in list(self._waiters.items()):
+            match_fn, from_cursor, _match_type, scan_cursor, overlap = waiter
             if future.done():
-                resolved.append(i)
+                self._waiters.pop(future, None)
                 continue
             try:
-                data, data_end_cursor = await self.read_spool(from_cursor, 1024 * 1024)  # 1MB max scan
+                start = max(from_cursor, scan_cursor - overlap)
+                data, data_end_cursor = await self._read_spool_bytes(start, 1024 * 1024)  # 1MB max scan
                 result = match_fn(data)
-                if result is not None:
-                    match_cursor = from_cursor + result["match_index"]
-                    match_end_cursor = from_cursor + result["match_end"]
+                if result is None:
+                    waiter[3] = max(scan_cursor, data_end_cursor)
+                else:
+                    match_cursor = start + result["match_index"]
+                    match_end_cursor = start + result["match_end"]
                     response = {
                         "matched": True,
                         "match_text": result["match_text"],
@@ -667,20 +870,18 @@ class ConversationState:
                     if result.get("extra"):
                         response["extra"] = result["extra"]
                     future.set_result(response)
-                    resolved.append(i)
+                    self._waiters.pop(future, None)
             except Exception as e:
-                future.set_exception(e)
-                resolved.append(i)
-        # Remove resolved waiters
-        for i in reversed(resolved):
-            self._waiters.pop(i)
+                if not future.done():
+                    future.set_exception(e)
+                self._waiters.pop(future, None)
 
     # === Sprint 1: Screen model methods ===
     
     async def _init_raw(self) -> None:
         """Initialize raw byte stream file."""
         if self._raw_path is None:
-            self._raw_path = _agent_pty_root(self.conversation_id) / "output.raw"
+            self._raw_path = self._root / "output.raw"
             self._raw_path.parent.mkdir(parents=True, exist_ok=True)
             if self._raw_path.exists():
                 self._raw_size = self._raw_path.stat().st_size
@@ -692,7 +893,8 @@ class ConversationState:
         """Refresh raw file size from disk."""
         await self._init_raw()
         try:
-            self._raw_size = self._raw_path.stat().st_size
+            # Appends may still be in flight outside _raw_lock; never move the end backwards.
+            self._raw_size = max(self._raw_path.stat().st_size, self._raw_size)
         except Exception:
             pass
 
@@ -700,26 +902,29 @@ class ConversationState:
         """Append raw bytes (lossless), return new size."""
         async with self._raw_lock:
             await self._init_raw()
-            await asyncio.to_thread(self._append_bytes, self._raw_path, data)
             self._raw_size += len(data)
-            return self._raw_size
+            size = self._raw_size
+            writer = self._writer(self._raw_path)
+        # Await outside the lock so concurrent appenders coalesce into one write.
+        await writer.append(data)
+        return size
 
     async def _append_raw_event(self, data: bytes) -> None:
         """Append raw chunk event (base64) for UI playback."""
-        path = _raw_events_path(self.conversation_id)
+        path = self._root / "raw_events.jsonl"
         payload = {
             "type": "agent_pty_raw",
             "conversation_id": self.conversation_id,
             "block_id": self._active.block_id if self._active else None,
-            "data_b64": base64.b64encode(data).decode("ascii"),
+            "data_b64": _b64.b64encode(data).decode("ascii"),
             "ts": _now_ms(),
         }
-        await asyncio.to_thread(self._append_text_line, path, json.dumps(payload, ensure_ascii=False) + "\n")
+        await self._writer(path).append(_jsonl(payload))
 
     async def _init_scrollback(self) -> None:
         """Initialize scrollback file for cursor-based access."""
         if self._scrollback_path is None:
-            self._scrollback_path = _agent_pty_root(self.conversation_id) / "scrollback.jsonl"
+            self._scrollback_path = self._root / "scrollback.jsonl"
             self._scrollback_path.parent.mkdir(parents=True, exist_ok=True)
             if self._scrollback_path.exists():
                 self._scrollback_size = self._scrollback_path.stat().st_size
@@ -933,6 +1138,9 @@ class ConversationState:
         "__fws_emit_begin",
         "__fws_emit_end",
         "__fws_now_ms",
+        "__fws_stamp_ms",
+        "__fws_b64",
+        "$__FWS_NOW_MS",
         # Wrapper structure fragments
         "eval \"$__fws_cmd\"",
         "base64 -d",
@@ -1070,7 +1278,7 @@ class ConversationState:
 
     async def _load_shell_id(self) -> Optional[str]:
         """Load cached shell id from disk."""
-        path = _shell_id_path(self.conversation_id)
+        path = self._root / "shell_id.txt"
         if not path.exists():
             return None
         try:
@@ -1082,7 +1290,7 @@ class ConversationState:
 
     async def _save_shell_id(self, shell_id: str) -> None:
         """Persist shell id to disk."""
-        path = _shell_id_path(self.conversation_id)
+        path = self._root / "shell_id.txt"
         path.parent.mkdir(parents=True, exist_ok=True)
         try:
             await asyncio.to_thread(path.write_text, shell_id, encoding="utf-8")
@@ -1134,10 +1342,9 @@ class ConversationState:
             }
             
             # Write to screen.jsonl
-            path = _screen_events_path(self.conversation_id)
-            path.parent.mkdir(parents=True, exist_ok=True)
+            path = self._root / "screen.jsonl"
             line = json.dumps(event, ensure_ascii=False)
-            await asyncio.to_thread(self._append_text_line, path, line + "\n")
+            await self._writer(path).append((line + "\n").encode("utf-8"))
             
         # Clear pending dirty rows and pyte's dirty set
         self._pending_dirty_rows.clear()
@@ -1197,7 +1404,7 @@ class ConversationState:
         if self._marker_task and not self._marker_task.done():
             return
         if self._marker_path is None:
-            self._marker_path = _marker_path(self.conversation_id)
+            self._marker_path = self._root / "markers.log"
         path = self._marker_path
         path.parent.mkdir(parents=True, exist_ok=True)
         if not path.exists():
@@ -1230,16 +1437,17 @@ class ConversationState:
                             continue
                         await self._append_spool(line + "\n")
                         await self._check_waiters(line)
+                        m = _MARKER_ANY_RE.search(line)
+                        if m is None:
+                            continue
+                        kind = m.group(0)
                         async with self.lock:
-                            if _MARKER_BEGIN in line:
+                            if kind == _MARKER_BEGIN:
                                 await self._handle_begin(line)
-                                continue
-                            if _MARKER_END in line:
+                            elif kind == _MARKER_END:
                                 await self._handle_end(line)
-                                continue
-                            if _MARKER_PROMPT in line:
+                            else:
                                 await self._handle_prompt(line)
-                                continue
                 except asyncio.CancelledError:
                     raise
                 except Exception:
@@ -1298,7 +1506,7 @@ class ConversationState:
     async def ensure_shell(self, *, cwd: Optional[str] = None) -> str:
         async with self.lock:
             mgr = await _get_fws_manager()
-            self._marker_path = _marker_path(self.conversation_id)
+            self._marker_path = self._root / "markers.log"
             # Load per-conversation preferred screen size (if any) before attach/resize.
             await self._load_persisted_screen_size()
             if self.shell_id:
@@ -1360,35 +1568,122 @@ class ConversationState:
         self._reader_task = asyncio.create_task(_run(), name=f"agent-pty-reader:{self.conversation_id}")
 
     async def exec(self, *, cmd: str, cwd: Optional[str] = None) -> Dict[str, Any]:
+        if not cmd:
+            return {"ok": False, "error": "empty command"}
         await self.ensure_shell(cwd=cwd)
         mgr = await _get_fws_manager()
-        cmd_b64 = base64.b64encode(cmd.encode("utf-8", errors="replace")).decode("ascii")
+        cmd_b64 = _b64.b64encode(cmd.encode("utf-8", errors="replace")).decode("ascii")
         async with self.lock:
-            loop = asyncio.get_running_loop()
-            self._begin_waiter = loop.create_future()
+            # seq/ts are chosen here and pinned into the BEGIN marker, so the block is known
+            # up front; _handle_begin adopts it (filling in the shell's cwd) when the marker lands.
+            seq = await self._next_seq()
+            ts = _now_ms()
+            info = BlockInfo(
+                block_id=f"{self.conversation_id}:{seq}:{ts}",
+                conversation_id=self.conversation_id,
+                seq=seq,
+                ts_begin=ts,
+                cwd=cwd or "",
+                cmd=cmd,
+                status="running",
+                output_path=str(self._blocks_dir / f"{seq}_{ts}.out"),
+            )
+            self._pending_block = info
+            self._mode = "block_running"
             # Clear screen BEFORE running the command so the final screen reflects only this run.
             await mgr.write_to_pty(self.shell_id, "\x1b[2J\x1b[H")
             # Wrap the entire submitted command line in a single BEGIN/END marker pair.
-            # This keeps `echo hi && pwd` as one block.
+            # This keeps `echo hi && pwd` as one block. The markers are printed inline with the
+            # cmd_b64 we already have, so bash only resolves and encodes the cwd (instead of a
+            # printf pipeline plus two encode subshells in __fws_emit_begin).
             wrapped = (
-                f'__fws_cmd="$(printf %s \'{cmd_b64}\' | base64 -d 2>/dev/null)"; '
-                'if [ -n "$__fws_cmd" ]; then '
-                '__FWS_SEQ=$((__FWS_SEQ + 1)); __fws_seq="$__FWS_SEQ"; '
-                '__fws_ts="$(__fws_now_ms)"; __fws_cwd="$(pwd -P 2>/dev/null || pwd)"; '
-                '__fws_emit_begin "$__fws_cmd" "$__fws_cwd" "$__fws_ts" "$__fws_seq"; '
-                'eval "$__fws_cmd"; __fws_ec="$?"; __fws_ts2="$(__fws_now_ms)"; '
-                '__fws_emit_end "$__fws_ec" "$__fws_ts2" "$__fws_seq"; '
+                f'__fws_cmd="$(base64 -d <<<\'{cmd_b64}\' 2>/dev/null)"; '
+                f'if [ -n "$__fws_cmd" ]; then __FWS_SEQ={seq}; '
+                f"printf '\\n__FWS_BLOCK_BEGIN__ seq={seq} ts={ts} cwd_b64=%s cmd_b64={cmd_b64}\\n' "
+                '"$(__fws_b64 "$(pwd -P 2>/dev/null || pwd)")" >&3; '
+                'eval "$__fws_cmd"; __fws_ec="$?"; __fws_stamp_ms; '
+                f"printf '\\n__FWS_BLOCK_END__ seq={seq} ts=%s exit=%s\\n' "
+                '"$__FWS_NOW_MS" "$__fws_ec" >&3; '
                 'fi\n'
             )
             if cwd:
                 wrapped = f'cd "{cwd}" 2>/dev/null || cd "{cwd}"\n' + wrapped
             await mgr.write_to_pty(self.shell_id, wrapped)
+            # If the shell never echoes the BEGIN marker, release the busy state like the old
+            # 3s begin timeout did (off the return path now).
+            self._cancel_pending_timer()
+            self._pending_timer = asyncio.get_running_loop().call_later(
+                _BEGIN_MARKER_TIMEOUT_S, self._expire_pending_block, info
+            )
+        # The block is only announced here: pending stays true until the BEGIN marker is read.
+        # If it never arrives within begin_timeout_s, an agent_block_begin_timeout event is logged.
+        return {
+            "ok": True,
+            "block_id": info.block_id,
+            "seq": seq,
+            "ts": ts,
+            "pending": self._pending_block is info,
+            "begin_timeout_s": _BEGIN_MARKER_TIMEOUT_S,
+        }
+
+    def _cancel_pending_timer(self) -> None:
+        if self._pending_timer is not None:
+            self._pending_timer.cancel()
+            self._pending_timer = None
+
+    def _expire_pending_block(self, info: BlockInfo) -> None:
+        self._pending_timer = None
+        if self._pending_block is not info:
+            return
+        self._pending_block = None
+        if self._active is None and self._mode == "block_running":
+            self._mode = "idle"
+        task = asyncio.create_task(self._append_event({
+            "type": "agent_block_begin_timeout",
+            "conversation_id": self.conversation_id,
+            "block": asdict(info),
+        }))
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_task_done)
+
+    def _bg_task_done(self, task: asyncio.Task) -> None:
+        self._bg_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[agent_pty] background task failed: {task.exception()!r}", file=sys.stderr)
+
+    async def _next_seq(self) -> int:
+        if self._last_seq is None:
+            self._last_seq = await asyncio.to_thread(self._read_last_seq)
+        self._last_seq += 1
+        return self._last_seq
+
+    def _read_last_seq(self) -> int:
+        """Highest block seq in the tail of the block index (0 for a new conversation)."""
+        # Read backwards in 8 KiB steps until at least one complete record parses, so a
+        # single oversized record at the end doesn't reset numbering.
         try:
-            info: BlockInfo = await asyncio.wait_for(self._begin_waiter, timeout=3.0)
-        finally:
-            async with self.lock:
-                self._begin_waiter = None
-        return {"ok": True, "block_id": info.block_id, "seq": info.seq, "ts": info.ts_begin}
+            with self._index_path.open("rb") as f:
+                pos = f.seek(0, os.SEEK_END)
+                carry = b""  # leading partial line of the previous (later) window
+                while pos > 0:
+                    start = max(0, pos - 8192)
+                    f.seek(start)
+                    chunk = f.read(pos - start) + carry
+                    pos = start
+                    lines = chunk.split(b"\n")
+                    carry = lines.pop(0) if pos > 0 else b""
+                    last = None
+                    for raw in lines:
+                        try:
+                            seq = int(_json_loads(raw).get("seq") or 0)
+                        except Exception:
+                            continue
+                        last = seq if last is None else max(last, seq)
+                    if last is not None:
+                        return last
+        except OSError:
+            pass
+        return 0
 
     async def exec_interactive(self, *, cmd: str, cwd: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -1406,7 +1701,7 @@ class ConversationState:
             self._interactive_session_id = f"interactive:{ts}"
             seq = 0  # Interactive sessions don't use seq numbers
             block_id = f"{self.conversation_id}:interactive:{ts}"
-            out_file = _blocks_dir(self.conversation_id) / f"interactive_{ts}.out"
+            out_file = self._blocks_dir / f"interactive_{ts}.out"
             
             info = BlockInfo(
                 block_id=block_id,
@@ -1419,12 +1714,13 @@ class ConversationState:
                 output_path=str(out_file),
             )
             self._active = info
+            self._active_out = out_file
             self._mode = "interactive"
             
             await self._append_event({
                 "type": "agent_block_begin",
                 "conversation_id": self.conversation_id,
-                "block": info.__dict__
+                "block": asdict(info)
             })
             
             # Send command directly (no wrappers)
@@ -1466,8 +1762,10 @@ class ConversationState:
             await self._append_event({
                 "type": "agent_block_end",
                 "conversation_id": self.conversation_id,
-                "block": self._active.__dict__
+                "block": asdict(self._active)
             })
+            self._close_writer(self._active_out)
+            self._active_out = None
             self._active = None
         
         self._mode = "idle"
@@ -1475,18 +1773,12 @@ class ConversationState:
         return {"ok": True}
 
     async def _append_event(self, payload: Dict[str, Any]) -> None:
-        path = _blocks_events_path(self.conversation_id)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        line = json.dumps(payload, ensure_ascii=False)
-        await asyncio.to_thread(self._append_line, path, line)
-
-    @staticmethod
-    def _append_line(path: Path, line: str) -> None:
-        with path.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        # Pending output must precede block end/begin (and anything else) in events.jsonl.
+        await self._flush_delta()
+        await self._writer(self._events_path).append(_jsonl(payload))
 
     async def _append_block_index(self, info: BlockInfo) -> None:
-        path = _blocks_index_path(self.conversation_id)
+        path = self._index_path
         payload = {
             "block_id": info.block_id,
             "conversation_id": info.conversation_id,
@@ -1499,7 +1791,7 @@ class ConversationState:
             "exit_code": info.exit_code,
             "output_path": info.output_path,
         }
-        await asyncio.to_thread(self._append_line, path, json.dumps(payload, ensure_ascii=False))
+        await self._writer(path).append(_jsonl(payload))
 
     async def _on_chunk(self, chunk: str) -> None:
         # Always notify raw chunk callbacks first (for xterm.js streaming)
@@ -1512,34 +1804,76 @@ class ConversationState:
         await self._check_waiters(chunk)
         
         async with self.lock:
-            self._buffer += chunk
-            while "\n" in self._buffer:
-                line, rest = self._buffer.split("\n", 1)
-                self._buffer = rest
-                await self._on_line(line)
+            buf = self._buffer
+            buf += chunk.encode("utf-8", errors="replace")
+            # Walk complete lines by offset and trim the consumed prefix once (no per-line copies).
+            lines = []
+            start = 0
+            while True:
+                nl = buf.find(b"\n", start)
+                if nl < 0:
+                    break
+                lines.append(buf[start:nl].decode("utf-8", errors="replace"))
+                start = nl + 1
+            if start:
+                del buf[:start]
+            # No newline for a long time (progress bars, binary spew): emit what we have as a
+            # line so the carry-over buffer stays bounded. Split on a UTF-8 boundary.
+            if len(buf) > _LINE_BUFFER_MAX:
+                cut = len(buf)
+                while cut > 0 and (buf[cut - 1] & 0xC0) == 0x80:
+                    cut -= 1
+                if cut > 0 and buf[cut - 1] >= 0xC0:
+                    cut -= 1
+                lines.append(buf[:cut].decode("utf-8", errors="replace"))
+                del buf[:cut]
+            await self._on_lines(lines)
             # Still write raw chunks to active block even if no newline boundaries.
             if self._active and chunk and "\n" not in chunk:
                 await self._write_output(chunk)
 
     async def _write_output(self, text: str) -> None:
-        if not self._active or not self._active.output_path:
+        if not self._active or self._active_out is None:
             return
-        path = Path(self._active.output_path)
-        await asyncio.to_thread(self._append_line, path, text.rstrip("\n"))
+        await self._writer(self._active_out).append((text.rstrip("\n") + "\n").encode("utf-8"))
 
-    async def _on_line(self, line: str) -> None:
-        if self._active:
-            # Preserve exact newlines by writing the line as-is; file is jsonl-ish but used as raw text.
-            out_path = Path(self._active.output_path)
-            await asyncio.to_thread(self._append_text_line, out_path, line + "\n")
-            await self._append_event(
-                {
-                    "type": "agent_block_delta",
-                    "conversation_id": self.conversation_id,
-                    "block_id": self._active.block_id,
-                    "delta": line + "\n",
-                }
-            )
+    async def _on_lines(self, lines: list) -> None:
+        if not self._active or not lines:
+            return
+        # Preserve exact newlines by writing the lines as-is; file is jsonl-ish but used as raw text.
+        # One append for the whole chunk instead of a write round-trip per line.
+        output = "".join(line + "\n" for line in lines)
+        block_id = self._active.block_id
+        if self._delta_block_id != block_id:
+            await self._flush_delta()
+            self._delta_block_id = block_id
+        self._delta_parts.append(output)
+        self._delta_size += len(output)
+        writes = [self._writer(self._active_out).append(output.encode("utf-8"))]
+        if self._delta_size >= _DELTA_FLUSH_BYTES:
+            writes.append(self._flush_delta())
+        elif self._delta_flush_task is None or self._delta_flush_task.done():
+            self._delta_flush_task = asyncio.create_task(self._flush_delta_later())
+        await asyncio.gather(*writes)
+
+    async def _flush_delta_later(self) -> None:
+        await asyncio.sleep(_DELTA_FLUSH_INTERVAL_S)
+        await self._flush_delta()
+
+    async def _flush_delta(self) -> None:
+        """Emit buffered output lines as a single agent_block_delta event."""
+        if not self._delta_parts:
+            return
+        delta = "".join(self._delta_parts)
+        self._delta_parts = []
+        self._delta_size = 0
+        # Queued synchronously inside append(), so it lands ahead of any later event.
+        await self._writer(self._events_path).append(_jsonl({
+            "type": "agent_block_delta",
+            "conversation_id": self.conversation_id,
+            "block_id": self._delta_block_id,
+            "delta": delta,
+        }))
 
     async def _handle_prompt(self, line: str) -> None:
         """
@@ -1594,7 +1928,7 @@ class ConversationState:
                 scrollback_snapshot["ts"] = ts
             
             # Write screen snapshot
-            screen_path = _agent_pty_root(self.conversation_id) / "screen.snapshot.json"
+            screen_path = self._root / "screen.snapshot.json"
             await asyncio.to_thread(
                 screen_path.write_text,
                 json.dumps(screen_snapshot, ensure_ascii=False),
@@ -1602,7 +1936,7 @@ class ConversationState:
             )
             
             # Write scrollback snapshot
-            scrollback_path = _agent_pty_root(self.conversation_id) / "scrollback.snapshot.json"
+            scrollback_path = self._root / "scrollback.snapshot.json"
             await asyncio.to_thread(
                 scrollback_path.write_text,
                 json.dumps(scrollback_snapshot, ensure_ascii=False),
@@ -1623,18 +1957,14 @@ class ConversationState:
         await self._append_event({
             "type": "agent_block_end",
             "conversation_id": self.conversation_id,
-            "block": self._active.__dict__
+            "block": asdict(self._active)
         })
+        self._close_writer(self._active_out)
+        self._active_out = None
         self._active = None
         self._interactive_session_id = None
         self._mode = "idle"
 
-    @staticmethod
-    def _append_text_line(path: Path, data: str) -> None:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("a", encoding="utf-8") as f:
-            f.write(data)
-
     @staticmethod
     def _parse_kv(marker_line: str) -> Dict[str, str]:
         out: Dict[str, str] = {}
@@ -1647,58 +1977,80 @@ class ConversationState:
         return out
 
     async def _handle_begin(self, line: str) -> None:
-        kv = self._parse_kv(line)
-        try:
-            seq = int(kv.get("seq", "0"))
-        except Exception:
-            seq = 0
-        try:
-            ts = int(kv.get("ts", str(_now_ms())))
-        except Exception:
-            ts = _now_ms()
-        cwd = _b64decode(kv.get("cwd_b64", ""))
-        cmd = _b64decode(kv.get("cmd_b64", ""))
-        block_id = f"{self.conversation_id}:{seq}:{ts}"
-        out_file = _blocks_dir(self.conversation_id) / f"{seq}_{ts}.out"
-        info = BlockInfo(
-            block_id=block_id,
-            conversation_id=self.conversation_id,
-            seq=seq,
-            ts_begin=ts,
-            cwd=cwd,
-            cmd=cmd,
-            status="running",
-            output_path=str(out_file),
-        )
+        m = _MARKER_BEGIN_RE.search(line)
+        if m is not None:
+            seq = int(m["seq"] or 0)
+            ts = int(m["ts"]) if m["ts"] else _now_ms()
+            cwd = _b64decode(m["cwd"])
+            cmd = _b64decode(m["cmd"])
+        else:
+            kv = self._parse_kv(line)
+            try:
+                seq = int(kv.get("seq", "0"))
+            except Exception:
+                seq = 0
+            try:
+                ts = int(kv.get("ts", str(_now_ms())))
+            except Exception:
+                ts = _now_ms()
+            cwd = _b64decode(kv.get("cwd_b64", ""))
+            cmd = _b64decode(kv.get("cmd_b64", ""))
+        pending = self._pending_block
+        if pending is not None and pending.seq == seq and pending.ts_begin == ts:
+            # exec() already announced this block; the marker only adds the shell's cwd.
+            self._pending_block = None
+            self._cancel_pending_timer()
+            info = pending
+            info.cwd = cwd
+        else:
+            info = BlockInfo(
+                block_id=f"{self.conversation_id}:{seq}:{ts}",
+                conversation_id=self.conversation_id,
+                seq=seq,
+                ts_begin=ts,
+                cwd=cwd,
+                cmd=cmd,
+                status="running",
+                output_path=str(self._blocks_dir / f"{seq}_{ts}.out"),
+            )
+        if self._last_seq is not None and seq > self._last_seq:
+            self._last_seq = seq
         self._active = info
+        self._active_out = Path(info.output_path)
         self._mode = "block_running"
-        await self._append_event({"type": "agent_block_begin", "conversation_id": self.conversation_id, "block": info.__dict__})
-        if self._begin_waiter and not self._begin_waiter.done():
-            self._begin_waiter.set_result(info)
+        await self._append_event({"type": "agent_block_begin", "conversation_id": self.conversation_id, "block": asdict(info)})
 
     async def _handle_end(self, line: str) -> None:
-        kv = self._parse_kv(line)
         if not self._active:
             return
-        try:
-            seq = int(kv.get("seq", "0"))
-        except Exception:
-            seq = 0
+        m = _MARKER_END_RE.search(line)
+        if m is not None:
+            seq = int(m["seq"] or 0)
+            ts = int(m["ts"]) if m["ts"] else _now_ms()
+            exit_code: Optional[int] = int(m["exit"])
+        else:
+            kv = self._parse_kv(line)
+            try:
+                seq = int(kv.get("seq", "0"))
+            except Exception:
+                seq = 0
+            try:
+                ts = int(kv.get("ts", str(_now_ms())))
+            except Exception:
+                ts = _now_ms()
+            try:
+                exit_code = int(kv.get("exit", "0"))
+            except Exception:
+                exit_code = None
         if seq and self._active.seq and seq != self._active.seq:
             return
-        try:
-            ts = int(kv.get("ts", str(_now_ms())))
-        except Exception:
-            ts = _now_ms()
-        try:
-            exit_code = int(kv.get("exit", "0"))
-        except Exception:
-            exit_code = None
         self._active.status = "completed"
         self._active.exit_code = exit_code
         self._active.ts_end = ts
         await self._append_block_index(self._active)
-        await self._append_event({"type": "agent_block_end", "conversation_id": self.conversation_id, "block": self._active.__dict__})
+        await self._append_event({"type": "agent_block_end", "conversation_id": self.conversation_id, "block": asdict(self._active)})
+        self._close_writer(self._active_out)
+        self._active_out = None
         self._active = None
         self._mode = "idle"
 
@@ -1722,67 +2074,78 @@ class ConversationState:
         Wait for a condition in output.
         Returns: {ok, matched, match_text, cursor}
         """
-        import re
-        
         await self._init_spool()
-        # Refresh spool size (external writers may have appended).
-        try:
-            if self._spool_path is not None:
-                self._spool_size = self._spool_path.stat().st_size
-        except Exception:
-            pass
         
-        # Build match function based on type
+        # Build match function based on type. Matchers scan raw spool bytes, so match_index /
+        # match_end are byte offsets (the same unit as cursors); only matched text is decoded.
         # Returns: {matched, match_text, match_index, match_end, extra?} or None
         def make_matcher():
             if match_type == "prompt":
-                def match_fn(data: str) -> Optional[Dict]:
-                    if _MARKER_PROMPT in data:
-                        idx = data.index(_MARKER_PROMPT)
-                        end_idx = idx + len(_MARKER_PROMPT)
+                marker = _MARKER_PROMPT.encode("ascii")
+                def match_fn(data: bytes) -> Optional[Dict]:
+                    idx = data.find(marker)
+                    if idx >= 0:
+                        end_idx = idx + len(marker)
+                        line_end = data.find(b"\n", idx)
+                        if line_end == -1:
+                            line_end = len(data)
+                        line = data[idx:line_end].decode("utf-8", errors="replace")
                         # Try to parse prompt fields for bonus info
                         extra = {}
-                        try:
-                            # Find the full line containing the prompt
-                            line_end = data.find("\n", idx)
-                            if line_end == -1:
-                                line_end = len(data)
-                            line = data[idx:line_end]
-                            # Parse kv pairs like ts=123 cwd_b64=... exit=0
-                            for part in line.split()[1:]:
-                                if "=" in part:
-                                    k, v = part.split("=", 1)
-                                    if k == "cwd_b64":
-                                        extra["cwd"] = _b64decode(v)
-                                    elif k == "ts":
-                                        extra["ts"] = int(v)
-                                    elif k == "exit":
-                                        extra["exit_code"] = int(v)
-                        except Exception:
-                            pass
+                        m = _MARKER_PROMPT_RE.match(line)
+                        if m is not None:
+                            if m["ts"]:
+                                extra["ts"] = int(m["ts"])
+                            extra["cwd"] = _b64decode(m["cwd"])
+                            extra["exit_code"] = int(m["exit"])
+                        else:
+                            try:
+                                # Unknown variant: parse kv pairs on the prompt line generically.
+                                for part in line.split()[1:]:
+                                    if "=" in part:
+                                        k, v = part.split("=", 1)
+                                        if k == "cwd_b64":
+                                            extra["cwd"] = _b64decode(v)
+                                        elif k == "ts":
+                                            extra["ts"] = int(v)
+                                        elif k == "exit":
+                                            extra["exit_code"] = int(v)
+                            except Exception:
+                                pass
                         return {"matched": True, "match_text": _MARKER_PROMPT, "match_index": idx, "match_end": end_idx, "extra": extra}
                     return None
                 return match_fn
             elif match_type == "regex":
-                pattern = re.compile(match)
-                def match_fn(data: str) -> Optional[Dict]:
-                    m = pattern.search(data)
+                pattern = _compile_wait_regex(match)
+                def match_fn(data: bytes) -> Optional[Dict]:
+                    # Regexes keep str (Unicode) semantics; surrogateescape round-trips every
+                    # byte so the span maps back to exact byte offsets.
+                    text = data.decode("utf-8", errors="surrogateescape")
+                    m = pattern.search(text)
                     if m:
-                        return {"matched": True, "match_text": m.group(0), "match_index": m.start(), "match_end": m.end()}
+                        start = len(text[:m.start()].encode("utf-8", errors="surrogateescape"))
+                        span = m.group(0).encode("utf-8", errors="surrogateescape")
+                        return {
+                            "matched": True,
+                            "match_text": span.decode("utf-8", errors="replace"),
+                            "match_index": start,
+                            "match_end": start + len(span),
+                        }
                     return None
                 return match_fn
             else:  # substring
-                def match_fn(data: str) -> Optional[Dict]:
-                    idx = data.find(match)
+                needle = match.encode("utf-8", errors="replace")
+                def match_fn(data: bytes) -> Optional[Dict]:
+                    idx = data.find(needle)
                     if idx >= 0:
-                        return {"matched": True, "match_text": match, "match_index": idx, "match_end": idx + len(match)}
+                        return {"matched": True, "match_text": match, "match_index": idx, "match_end": idx + len(needle)}
                     return None
                 return match_fn
         
         match_fn = make_matcher()
         
         # First check existing spool data
-        data, data_end_cursor = await self.read_spool(from_cursor, max_bytes)
+        data, data_end_cursor = await self._read_spool_bytes(from_cursor, max_bytes)
         result = match_fn(data)
         if result:
             match_cursor = from_cursor + result["match_index"]
@@ -1806,7 +2169,13 @@ class ConversationState:
         # Not found - register waiter
         loop = asyncio.get_running_loop()
         future: asyncio.Future = loop.create_future()
-        self._waiters.append((match_fn, future, from_cursor, match_type))
+        if match_type == "prompt":
+            overlap = len(_MARKER_PROMPT) - 1
+        elif match_type == "regex":
+            overlap = _WAIT_REGEX_OVERLAP
+        else:
+            overlap = max(0, len(match.encode("utf-8", errors="replace")) - 1)
+        self._waiters[future] = [match_fn, from_cursor, match_type, data_end_cursor, overlap]
         
         try:
             result = await asyncio.wait_for(future, timeout=timeout_ms / 1000.0)
@@ -1817,15 +2186,11 @@ class ConversationState:
             return {"ok": True, **result}
         except asyncio.TimeoutError:
             # Return current spool size so agent can resume from here
-            try:
-                if self._spool_path is not None:
-                    self._spool_size = self._spool_path.stat().st_size
-            except Exception:
-                pass
+            await self._init_spool()
             return {"ok": False, "matched": False, "error": "timeout", "resume_cursor": self._spool_size}
         finally:
             # Clean up waiter if still present
-            self._waiters = [(m, f, c, t) for (m, f, c, t) in self._waiters if f is not future]
+            self._waiters.pop(future, None)
 
     def get_status(self) -> Dict[str, Any]:
         """Get current PTY status."""
@@ -1856,7 +2221,12 @@ class ConversationState:
         self._screen_delta_task = None
 
         # Reset local state (screen/raw remain on disk).
+        self._close_writer(self._active_out)
+        await asyncio.to_thread(self._close_read_fds)
+        self._active_out = None
         self._active = None
+        self._pending_block = None
+        self._cancel_pending_timer()
         self._mode = "idle"
         self._interactive_session_id = None
         self.shell_id = None
@@ -2139,11 +2509,9 @@ async def pty_read_raw(
         if from_offset >= state._raw_size:
             return {"ok": True, "data_b64": "", "offset": from_offset, "resume_offset": state._raw_size, "raw_size": state._raw_size}
         
-        data = await asyncio.to_thread(
-            ConversationState._read_bytes, state._raw_path, from_offset, max_bytes
-        )
+        data = await asyncio.to_thread(state._read_bytes, state._raw_path, from_offset, max_bytes)
         # Return as base64 (primary) - safe for JSON transport
-        data_b64 = base64.b64encode(data).decode("ascii")
+        data_b64 = _b64.b64encode(data).decode("ascii")
         return {
             "ok": True,
             "data_b64": data_b64,
@@ -2416,91 +2784,217 @@ async def pty_screen_status(conversation_id: str) -> Dict[str, Any]:
 @mcp.tool(name="blocks_since", description="List blocks since a byte cursor in blocks.jsonl (per conversation).")
 async def blocks_since(conversation_id: str, cursor: int = 0, limit: int = 50) -> Dict[str, Any]:
     path = _blocks_index_path(conversation_id)
-    if not path.exists():
-        return {"ok": True, "cursor": 0, "next_cursor": 0, "items": []}
     cursor = max(0, int(cursor))
     limit = max(1, min(int(limit), 200))
-    data = await asyncio.to_thread(path.read_bytes)
-    if cursor > len(data):
-        cursor = len(data)
-    tail = data[cursor:]
-    lines = tail.splitlines()[:limit]
+    try:
+        cursor, lines, next_cursor = await asyncio.to_thread(_read_lines_from, path, cursor, limit)
+    except FileNotFoundError:
+        return {"ok": True, "cursor": 0, "next_cursor": 0, "items": []}
     items = []
     for raw in lines:
         try:
-            items.append(json.loads(raw))
+            items.append(_json_loads(raw))
         except Exception:
             continue
-    # Advance cursor to end of the consumed lines
-    consumed = b"\n".join(lines)
-    next_cursor = cursor + len(consumed) + (1 if lines else 0)
     return {"ok": True, "cursor": cursor, "next_cursor": next_cursor, "items": items}
 
 
+def _read_lines_from(path: Path, cursor: int, limit: int) -> tuple:
+    """Read up to `limit` complete lines starting at byte `cursor` (clamped to EOF).
+
+    Reads forward from the cursor in 64KB steps instead of loading the whole file, so a
+    poll near EOF costs a few KB. Returns (cursor, lines, next_cursor); next_cursor is the
+    offset just past the last returned line.
+    """
+    with path.open("rb") as f:
+        cursor = min(cursor, os.fstat(f.fileno()).st_size)
+        f.seek(cursor)
+        lines: list = []
+        next_cursor = cursor
+        pending = b""
+        while len(lines) < limit:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            parts = (pending + chunk).split(b"\n")
+            pending = parts.pop()  # incomplete line (or b"") carried into the next read
+            for raw in parts[: limit - len(lines)]:
+                lines.append(raw)
+                next_cursor += len(raw) + 1
+    return cursor, lines, next_cursor
+
+
 @mcp.tool(name="blocks_read", description="Read raw output bytes from a block output file.")
 async def blocks_read(conversation_id: str, block_id: str, offset: int = 0, max_bytes: int = 65536) -> Dict[str, Any]:
     max_bytes = max(1, min(int(max_bytes), 512 * 1024))
     offset = max(0, int(offset))
-    # Resolve output_path by scanning blocks.jsonl backwards (cheap enough for now)
-    meta = await blocks_get(conversation_id, block_id)
-    if not meta.get("ok") or not meta.get("block"):
-        return {"ok": False, "error": "block not found"}
-    out_path = meta["block"].get("output_path")
-    if not out_path:
-        return {"ok": False, "error": "no output path"}
-    path = Path(out_path)
-    if not path.exists():
-        return {"ok": False, "error": "output missing"}
-    data = await asyncio.to_thread(path.read_bytes)
-    if offset > len(data):
-        offset = len(data)
-    chunk = data[offset : offset + max_bytes]
-    return {"ok": True, "offset": offset, "next_offset": offset + len(chunk), "data": chunk.decode("utf-8", errors="replace")}
+
+    def _read() -> tuple:
+        return _read_window(_block_output_file(conversation_id, block_id), offset, max_bytes)
+
+    try:
+        start, chunk = await asyncio.to_thread(_read)
+    except LookupError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "offset": start, "next_offset": start + len(chunk), "data": chunk.decode("utf-8", errors="replace")}
+
+
+def _read_window(path: Path, offset: int, max_bytes: int) -> tuple:
+    """Read up to max_bytes at offset (clamped to EOF) without loading the whole file."""
+    with path.open("rb") as f:
+        offset = min(offset, os.fstat(f.fileno()).st_size)
+        f.seek(offset)
+        return offset, f.read(max_bytes)
 
 
 @mcp.tool(name="blocks_get", description="Get metadata for a block id (from blocks.jsonl).")
 async def blocks_get(conversation_id: str, block_id: str) -> Dict[str, Any]:
     path = _blocks_index_path(conversation_id)
-    if not path.exists():
-        return {"ok": False, "error": "no blocks yet"}
     try:
-        lines = await asyncio.to_thread(path.read_text, encoding="utf-8", errors="replace")
+        obj = await asyncio.to_thread(_find_last_block_record, path, block_id)
+    except FileNotFoundError:
+        return {"ok": False, "error": "no blocks yet"}
     except Exception:
         return {"ok": False, "error": "read failed"}
-    # scan backwards for latest matching block_id
-    for raw in reversed(lines.splitlines()):
-        try:
-            obj = json.loads(raw)
-        except Exception:
-            continue
-        if obj.get("block_id") == block_id:
-            return {"ok": True, "block": obj}
+    if obj is not None:
+        return {"ok": True, "block": obj}
     return {"ok": False, "error": "block not found"}
 
 
+# blocks.jsonl path -> {"ino", "scanned", "ids": {block_id: (offset, length)}}, built once
+# and then extended from the last scanned offset as the index grows.
+_block_id_index: Dict[Path, Dict[str, Any]] = {}
+# Lookups run in worker threads: one lock per blocks.jsonl, so scanning a large index only
+# stalls lookups on the same conversation. The global lock just guards creating those.
+_block_id_index_locks: Dict[Path, threading.Lock] = {}
+_block_id_index_lock = threading.Lock()
+
+
+def _block_id_index_path_lock(path: Path) -> threading.Lock:
+    with _block_id_index_lock:
+        lock = _block_id_index_locks.get(path)
+        if lock is None:
+            lock = _block_id_index_locks[path] = threading.Lock()
+        return lock
+
+
+def _find_last_block_record(path: Path, block_id: str) -> Optional[Dict[str, Any]]:
+    """Latest blocks.jsonl record for block_id (dict lookup + one pread)."""
+    with _block_id_index_path_lock(path), path.open("rb") as f:
+        st = os.fstat(f.fileno())
+        entry = _block_id_index.get(path)
+        if entry is None or entry["ino"] != st.st_ino or st.st_size < entry["scanned"]:
+            # New, replaced or truncated file: index from scratch.
+            entry = {"ino": st.st_ino, "scanned": 0, "ids": {}}
+            _block_id_index[path] = entry
+        if st.st_size > entry["scanned"]:
+            base = entry["scanned"]
+            f.seek(base)
+            data = f.read(st.st_size - base)
+            ids = entry["ids"]
+            pos = 0
+            while True:
+                nl = data.find(b"\n", pos)
+                if nl < 0:
+                    break  # incomplete tail line; picked up on a later call
+                try:
+                    bid = _json_loads(data[pos:nl]).get("block_id")
+                except Exception:
+                    bid = None
+                if isinstance(bid, str):
+                    ids[bid] = (base + pos, nl - pos)  # later records win
+                pos = nl + 1
+            entry["scanned"] = base + pos
+        loc = entry["ids"].get(block_id)
+        if loc is None:
+            return None
+        obj = _json_loads(os.pread(f.fileno(), loc[1], loc[0]))
+    return obj if isinstance(obj, dict) else None
+
+
 @mcp.tool(name="blocks_search", description="Search within a block's output for a substring; returns matching line snippets.")
 async def blocks_search(conversation_id: str, block_id: str, query: str, limit: int = 50) -> Dict[str, Any]:
-    meta = await blocks_get(conversation_id, block_id)
-    if not meta.get("ok") or not meta.get("block"):
-        return {"ok": False, "error": "block not found"}
-    out_path = meta["block"].get("output_path")
-    if not out_path:
-        return {"ok": False, "error": "no output path"}
-    path = Path(out_path)
-    if not path.exists():
-        return {"ok": False, "error": "output missing"}
     query = str(query or "")
     limit = max(1, min(int(limit), 200))
-    text = await asyncio.to_thread(path.read_text, encoding="utf-8", errors="replace")
-    hits = []
-    for i, line in enumerate(text.splitlines()):
-        if query in line:
-            hits.append({"line": i + 1, "text": line})
-            if len(hits) >= limit:
-                break
+
+    def _search() -> list:
+        return _search_output_file(_block_output_file(conversation_id, block_id), query, limit)
+
+    try:
+        hits = await asyncio.to_thread(_search)
+    except LookupError as e:
+        return {"ok": False, "error": str(e)}
     return {"ok": True, "hits": hits}
 
 
+def _block_output_file(conversation_id: str, block_id: str) -> Path:
+    """Resolve a block's output file (worker-thread side of blocks_read/blocks_search).
+
+    Raises LookupError carrying the tool error string when it cannot be resolved.
+    """
+    try:
+        block = _find_last_block_record(_blocks_index_path(conversation_id), block_id)
+    except Exception:
+        block = None
+    if not block:
+        raise LookupError("block not found")
+    out_path = block.get("output_path")
+    if not out_path:
+        raise LookupError("no output path")
+    path = Path(out_path)
+    if not path.exists():
+        raise LookupError("output missing")
+    return path
+
+
+# mmap.find() holds the GIL for the whole call; scanning in windows gives other threads
+# (and the event loop) a chance to run between slices of a multi-MB output.
+_SEARCH_WINDOW = 1 << 20
+
+
+def _search_output_file(path: Path, query: str, limit: int) -> list:
+    """First `limit` lines of a block output file containing `query` (1-based line numbers).
+
+    Searches the mmapped bytes with find() and decodes only the matching lines, so a large
+    output is never materialised as a str / list of lines.
+    """
+    needle = query.encode("utf-8", errors="replace")
+    hits: list = []
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hits
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            pos = 0  # start of the line after the previous hit
+            line_no = 1  # line number at `pos`
+            while len(hits) < limit and pos < size:
+                i = -1
+                win = pos
+                while win < size:
+                    # Windows overlap by len(needle) so a match on a boundary isn't missed.
+                    i = mm.find(needle, win, min(size, win + _SEARCH_WINDOW + len(needle)))
+                    if i >= 0:
+                        break
+                    win += _SEARCH_WINDOW
+                if i < 0:
+                    break
+                nl = mm.rfind(b"\n", pos, i)
+                ls = pos if nl < 0 else nl + 1
+                # Count newlines skipped since the last hit in bounded slices (mmap has no count()).
+                for a in range(pos, ls, 1 << 20):
+                    line_no += mm[a : min(ls, a + (1 << 20))].count(b"\n")
+                le = mm.find(b"\n", i)
+                if le < 0:
+                    le = size
+                line = mm[ls:le]
+                if line.endswith(b"\r"):
+                    line = line[:-1]
+                hits.append({"line": line_no, "text": line.decode("utf-8", errors="replace")})
+                pos = le + 1
+                line_no += 1
+    return hits
+
+
 # =============================================================================
 # Agent Log MCP Tools
 # =============================================================================
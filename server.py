@@ -1,15 +1,19 @@
 #!/usr/bin/env python3
 import asyncio
 import base64
+import copy
 import json
 import os
 import argparse
 import time
+from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
 from contextlib import suppress, asynccontextmanager
+import functools
 import hashlib
+import mmap
 import re
 import secrets
 import uuid
@@ -36,6 +40,42 @@ from fasthtml.common import (
     Span, Input, Textarea, Label, Small, A, Ul, Li, Code, Script, Link, Meta, to_xml
 )
 
+try:
+    # Optional faster JSON codec for meta.json / rollout / events reads and meta / config /
+    # envelope / transcript writes.
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+# Both accept bytes, so callers can skip the decode-to-str step.
+_json_loads = _orjson.loads if _orjson is not None else json.loads
+
+
+def _json_text(payload: Any) -> str:
+    """Encode one websocket text frame (orjson when available)."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(payload, option=_orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass  # e.g. ints past 64 bits; the stdlib encoder handles those
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _jsonl(payload: Dict[str, Any]) -> bytes:
+    """Encode one JSONL record (trailing newline included)."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(payload, option=_orjson.OPT_APPEND_NEWLINE | _orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. ints past 64 bits; the stdlib encoder handles those
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+try:
+    # Optional inotify/kqueue wakeups for the agent PTY tailers (polling without it).
+    from watchfiles import awatch as _awatch
+except ImportError:
+    _awatch = None
+
 @asynccontextmanager
 async def _lifespan(app: FastAPI):
     agent_pty_monitor_task: Optional[asyncio.Task] = None
@@ -69,6 +109,15 @@ async def _lifespan(app: FastAPI):
         agent_pty_monitor_task.cancel()
         with suppress(asyncio.CancelledError):
             await agent_pty_monitor_task
+    # Persist any coalesced meta.json / config / transcript / tailer offset writes.
+    with suppress(Exception):
+        _flush_conversation_meta()
+    with suppress(Exception):
+        _flush_appserver_config()
+    with suppress(Exception):
+        _flush_transcript_entries_sync()
+    with suppress(Exception):
+        _flush_agent_pty_transcript_offsets()
     # Cleanup on server shutdown: kill extension-owned subprocess shells.
     with suppress(Exception):
         await _terminate_agent_pty_conversation_shells(force=True)
@@ -104,13 +153,18 @@ app.include_router(fws_ui.router, dependencies=[Depends(lambda: _ensure_framewor
 LOG_PATH: Optional[Path] = None
 _lock = asyncio.Lock()
 _config_lock = asyncio.Lock()
+# Serializes first-time conversation creation in _ensure_conversation (it yields mid-way).
+_conversation_create_lock = asyncio.Lock()
 _appserver_shell_id: Optional[str] = None
 _appserver_reader_task: Optional[asyncio.Task] = None
-_appserver_ws_clients_ui: List[WebSocket] = []
-_appserver_ws_clients_raw: List[WebSocket] = []
-_appserver_turn_state: Dict[str, Dict[str, Any]] = {}
-_appserver_item_state: Dict[str, Dict[str, Any]] = {}
-_appserver_raw_buffer: List[str] = []
+_appserver_ws_clients_ui: set[WebSocket] = set()
+_appserver_ws_clients_raw: set[WebSocket] = set()
+_appserver_turn_state: Dict[str, "_TurnState"] = {}
+_appserver_item_state: Dict[str, "_TurnState"] = {}
+_appserver_raw_buffer: Deque[str] = deque(maxlen=500)
+# item/call id -> cached approval details / JSON-RPC request id. Bounded (oldest evicted via
+# _lru_put): entries are only needed between an item's start and its approval.
+_APPROVAL_CACHE_MAX = 2048
 _approval_item_cache: Dict[str, Dict[str, Any]] = {}
 _approval_request_map: Dict[str, str] = {}
 _appserver_rpc_waiters: Dict[str, asyncio.Future] = {}
@@ -120,12 +174,8 @@ _shell_call_ids: Dict[str, Dict[str, Any]] = {}  # Track active shell commands f
 _model_list_cache: Optional[List[Dict[str, Any]]] = None
 _model_list_cache_time: float = 0
 _agent_pty_event_tasks: Dict[str, asyncio.Task] = {}
-_agent_pty_ws_offsets: Dict[str, int] = {}
+_agent_pty_ws_offsets: Dict[Path, int] = {}  # per tailed file (events / screen / raw)
 _agent_pty_transcript_offsets: Dict[str, int] = {}
-_agent_pty_screen_event_tasks: Dict[str, asyncio.Task] = {}
-_agent_pty_screen_ws_offsets: Dict[str, int] = {}
-_agent_pty_raw_event_tasks: Dict[str, asyncio.Task] = {}
-_agent_pty_raw_ws_offsets: Dict[str, int] = {}
 _mcp_shell_id: Optional[str] = None
 _shell_manager_shell_id: Optional[str] = None
 _agent_pty_exec_seq: int = 0
@@ -156,6 +206,12 @@ def _asset(url: str) -> str:
     """Append a cache-busting query string based on file mtime."""
     if not url.startswith("/static/"):
         return url
+    # Stat once per process; in debug mode refresh every 5s so edits still bust the cache.
+    return _asset_versioned(url, int(time.time()) // 5 if DEBUG_MODE else 0)
+
+
+@functools.lru_cache(maxsize=512)
+def _asset_versioned(url: str, _bucket: int) -> str:
     rel = url.lstrip("/")
     path = Path(__file__).resolve().parent / rel
     try:
@@ -168,7 +224,20 @@ CONFIG_PATH = Path(os.path.expanduser("~/.cache/app_server/app_server_config.jso
 LEGACY_TRANSCRIPT_DIR = CONFIG_PATH.parent / "transcripts"
 CONVERSATION_DIR = CONFIG_PATH.parent / "conversations"
 _transcript_lock = asyncio.Lock()
-_transcript_seen: set[tuple[str, str, str]] = set()
+# (conversation_id, item_id, role) keys already appended; bounded LRU (dict in recency order).
+_TRANSCRIPT_SEEN_MAX = 50_000
+_transcript_seen: Dict[Tuple[str, str, str], None] = {}
+
+# Transcript append batching. Records are serialized (and deduped) at enqueue time, so order is
+# fixed on the event loop; pending lines are written per conversation in one O_APPEND write every
+# _TRANSCRIPT_FLUSH_INTERVAL_S, or as soon as _TRANSCRIPT_FLUSH_MAX_BYTES are pending. Anything
+# that reads or replaces transcript.jsonl awaits _flush_transcript_entries() first.
+_TRANSCRIPT_FLUSH_INTERVAL_S = 0.02
+_TRANSCRIPT_FLUSH_MAX_BYTES = 64 * 1024
+_transcript_pending: Dict[Path, List[bytes]] = {}
+_transcript_pending_bytes = 0
+_transcript_flush_now = asyncio.Event()
+_transcript_flush_task: Optional[asyncio.Task] = None
 
 
 def _default_appserver_config() -> Dict[str, Any]:
@@ -186,7 +255,47 @@ def _default_appserver_config() -> Dict[str, Any]:
     }
 
 
+# Config write-back cache. This process is the only writer of CONFIG_PATH, so after the first
+# read every load is a copy of the in-memory config and saves are coalesced into one
+# (atomic) write at most every _CONFIG_FLUSH_INTERVAL_S. Loads hand out copies, so a caller
+# that mutates cfg without saving doesn't leak changes into the next load.
+_CONFIG_FLUSH_INTERVAL_S = 0.02
+_config_cache: Optional[Dict[str, Any]] = None
+_config_dirty = False
+_config_flush_task: Optional[asyncio.Task] = None
+
+
+def _write_appserver_config_file(cfg: Dict[str, Any]) -> None:
+    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CONFIG_PATH.with_name(CONFIG_PATH.name + ".tmp")
+    if _orjson is not None:
+        tmp.write_bytes(_orjson.dumps(cfg, option=_orjson.OPT_INDENT_2 | _orjson.OPT_NON_STR_KEYS))
+    else:
+        tmp.write_text(json.dumps(cfg, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, CONFIG_PATH)
+
+
+def _flush_appserver_config() -> None:
+    """Write the config now if a save is pending."""
+    global _config_dirty
+    if not _config_dirty or _config_cache is None:
+        return
+    _config_dirty = False
+    try:
+        _write_appserver_config_file(_config_cache)
+    except Exception as e:
+        print(f"[config] Failed to write {CONFIG_PATH}: {e}")
+
+
+async def _config_flush_later() -> None:
+    await asyncio.sleep(_CONFIG_FLUSH_INTERVAL_S)
+    _flush_appserver_config()
+
+
 def _load_appserver_config() -> Dict[str, Any]:
+    global _config_cache
+    if _config_cache is not None:
+        return copy.deepcopy(_config_cache)
     cfg = _default_appserver_config()
     try:
         if CONFIG_PATH.exists():
@@ -194,17 +303,39 @@ def _load_appserver_config() -> Dict[str, Any]:
             if isinstance(data, dict):
                 cfg.update(data)
         else:
-            CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-            CONFIG_PATH.write_text(json.dumps(cfg, indent=2, ensure_ascii=False), encoding="utf-8")
+            _write_appserver_config_file(cfg)
     except Exception:
-        # Fall back to defaults on any read/parse error.
+        # Fall back to defaults on any read/parse error (and retry the read next time).
         return cfg
-    return cfg
+    _config_cache = cfg
+    return copy.deepcopy(cfg)
+
+
+def _peek_appserver_config() -> Dict[str, Any]:
+    """The cached config itself (no copy) for read-only lookups on hot paths; don't mutate it.
+
+    Needs no _config_lock: saves publish a new dict by assignment and never modify the old
+    one, so what this returns is a consistent snapshot. Writers still take the lock.
+    """
+    if _config_cache is None:
+        return _load_appserver_config()
+    return _config_cache
 
 
 def _save_appserver_config(cfg: Dict[str, Any]) -> None:
-    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CONFIG_PATH.write_text(json.dumps(cfg, indent=2, ensure_ascii=False), encoding="utf-8")
+    global _config_cache, _config_dirty, _config_flush_task
+    _config_cache = copy.deepcopy(cfg)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None:
+        _config_dirty = False
+        _write_appserver_config_file(_config_cache)
+        return
+    _config_dirty = True
+    if _config_flush_task is None or _config_flush_task.done():
+        _config_flush_task = loop.create_task(_config_flush_later(), name="appserver-config-flush")
 
 
 def _normalize_conversation_list(cfg: Dict[str, Any]) -> List[str]:
@@ -260,6 +391,10 @@ def _sync_conversation_index(cfg: Dict[str, Any]) -> List[str]:
 def _find_conversation_by_thread_id(thread_id: Optional[str]) -> Optional[str]:
     if not thread_id or not CONVERSATION_DIR.exists():
         return None
+    # Cached metas may be newer than disk (write-back pending).
+    for cid, meta in _meta_cache.items():
+        if meta.get("thread_id") == thread_id:
+            return cid
     for child in CONVERSATION_DIR.iterdir():
         if not child.is_dir():
             continue
@@ -274,15 +409,18 @@ def _find_conversation_by_thread_id(thread_id: Optional[str]) -> Optional[str]:
             return child.name
     return None
 
+@functools.lru_cache(maxsize=1024)
 def _conversation_dir(conversation_id: str) -> Path:
     safe_id = _sanitize_conversation_id(conversation_id)
     return CONVERSATION_DIR / safe_id
 
 
+@functools.lru_cache(maxsize=1024)
 def _conversation_meta_path(conversation_id: str) -> Path:
     return _conversation_dir(conversation_id) / "meta.json"
 
 
+@functools.lru_cache(maxsize=1024)
 def _conversation_transcript_path(conversation_id: str) -> Path:
     return _conversation_dir(conversation_id) / "transcript.jsonl"
 
@@ -297,14 +435,17 @@ def _default_conversation_meta(conversation_id: str) -> Dict[str, Any]:
     }
 
 
+@functools.lru_cache(maxsize=1024)
 def _user_pty_root(conversation_id: str) -> Path:
     return _conversation_dir(conversation_id) / _USER_PTY_RAW_DIRNAME
 
 
+@functools.lru_cache(maxsize=1024)
 def _user_pty_raw_path(conversation_id: str) -> Path:
     return _user_pty_root(conversation_id) / "output.raw"
 
 
+@functools.lru_cache(maxsize=1024)
 def _user_pty_marker_path(conversation_id: str) -> Path:
     # Markers are emitted by the agent_pty rcfile to fd3 and written under agent_pty.
     return _conversation_dir(conversation_id) / "agent_pty" / "markers.log"
@@ -314,15 +455,31 @@ def _user_pty_marker_offset_path(conversation_id: str) -> Path:
     return _user_pty_root(conversation_id) / ".markers_offset"
 
 
+# Terminal escape patterns used by the transcript/card scrubbers (compiled once; hot per chunk).
+# OSC: ESC ] ... BEL or ST
+_OSC_RE = re.compile(r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)")
+# CSI: ESC [ ... final byte
+_CSI_RE = re.compile(r"\x1b\[[0-9;:?]*[ -/]*[@-~]")
+# CSI SGR only (colors)
+_SGR_RE = re.compile(r"\x1b\[[0-9;]*m")
+# The exact PS1 format set in shell_manager.py rcfile.
+_PROMPT_LINE_RE = re.compile(r"^\x1b\[0;32m.*?\x1b\[0m \x1b\[0;97m\$\x1b\[0m\s*$")
+
+
+@functools.lru_cache(maxsize=256)
+def _echoed_command_res(cmd: str) -> Tuple[re.Pattern, re.Pattern]:
+    """`$ cmd` and `<anything> $ cmd` echo patterns for one command."""
+    e = re.escape(cmd)
+    return re.compile(rf"^\$\s*{e}\s*$"), re.compile(rf"^.*\$\s*{e}\s*$")
+
+
 def _ansi_strip(text: str) -> str:
     # Strip CSI + OSC sequences; keep printable output for transcript cards.
     if not text:
         return ""
     try:
-        # OSC: ESC ] ... BEL or ST
-        text = re.sub(r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)", "", text)
-        # CSI: ESC [ ... letter
-        text = re.sub(r"\x1b\[[0-9;:?]*[ -/]*[@-~]", "", text)
+        text = _OSC_RE.sub("", text)
+        text = _CSI_RE.sub("", text)
     except Exception:
         return text
     return text
@@ -341,7 +498,7 @@ def _scrub_user_cmd_output_keep_sgr(text: str) -> str:
         text = text.replace("\r\n", "\n").replace("\r", "\n")
 
         # Drop OSC sequences (titles, etc.)
-        text = re.sub(r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)", "", text)
+        text = _OSC_RE.sub("", text)
 
         # Drop save/restore cursor (ESC 7 / ESC 8)
         text = text.replace("\x1b7", "").replace("\x1b8", "")
@@ -351,27 +508,48 @@ def _scrub_user_cmd_output_keep_sgr(text: str) -> str:
             seq = m.group(0)
             return seq if seq.endswith("m") else ""
 
-        text = re.sub(r"\x1b\[[0-9;:?]*[ -/]*[@-~]", _keep_sgr, text)
+        text = _CSI_RE.sub(_keep_sgr, text)
 
         # Apply backspaces naively (common from readline/progress redraws).
-        out_chars: list[str] = []
-        for ch in text:
-            if ch == "\b":
-                if out_chars:
-                    out_chars.pop()
-                continue
-            out_chars.append(ch)
-        return "".join(out_chars)
+        if "\b" not in text:
+            return text
+        # Work on the runs between backspaces (C-level split/slice) rather than per char;
+        # a run of k backspaces trims k chars off the output built so far.
+        parts = text.split("\b")
+        out: list[str] = [parts[0]]
+
+        def _drop_tail(n: int) -> None:
+            while n and out:
+                last = out[-1]
+                if len(last) <= n:
+                    n -= len(last)
+                    out.pop()
+                else:
+                    out[-1] = last[:-n]
+                    n = 0
+
+        pending = 0
+        for part in parts[1:]:
+            pending += 1
+            if part:
+                _drop_tail(pending)
+                pending = 0
+                out.append(part)
+        _drop_tail(pending)
+        return "".join(out)
     except Exception:
         return text
 
 
+_HOME = os.path.expanduser("~")
+
+
 def _termux_user_prompt_from_cwd(cwd: str) -> str:
     """Render a prompt consistent with the agent_pty rcfile PS1 (SGR colors kept)."""
     if not isinstance(cwd, str):
         cwd = ""
     # Common Termux path: /data/data/com.termux/files/home -> ~
-    home = os.path.expanduser("~")
+    home = _HOME
     if cwd and home and cwd.startswith(home):
         cwd_disp = "~" + cwd[len(home):]
         if cwd_disp == "":
@@ -390,9 +568,7 @@ def _strip_trailing_prompt_lines(text: str) -> str:
     while lines and not lines[-1].strip():
         lines.pop()
     # Strip one or more trailing prompt-looking lines.
-    # We match the exact PS1 format set in shell_manager.py rcfile.
-    prompt_re = re.compile(r"^\x1b\[0;32m.*?\x1b\[0m \x1b\[0;97m\$\x1b\[0m\s*$")
-    while lines and prompt_re.match(lines[-1]):
+    while lines and _PROMPT_LINE_RE.match(lines[-1]):
         lines.pop()
         while lines and not lines[-1].strip():
             lines.pop()
@@ -419,7 +595,7 @@ def _strip_leading_echoed_command(text: str, prompt: str, cmd: str) -> str:
 
         def _strip_sgr(s: str) -> str:
             # Remove only CSI SGR sequences (keeps semantics for comparison).
-            return re.sub(r"\x1b\[[0-9;]*m", "", s or "")
+            return _SGR_RE.sub("", s or "")
 
         expected = _strip_sgr(f"{prompt}{cmd}").strip()
         first_norm = _strip_sgr(first).strip()
@@ -429,11 +605,12 @@ def _strip_leading_echoed_command(text: str, prompt: str, cmd: str) -> str:
             lines.pop(i)
         else:
             # Fallback: many shells echo as `$ cmd` without cwd.
-            if re.match(rf"^\$\s*{re.escape(cmd)}\s*$", first_norm):
+            bare_re, any_prefix_re = _echoed_command_res(cmd)
+            if bare_re.match(first_norm):
                 lines.pop(i)
             else:
                 # Or as `<anything> $ cmd` (path stripped/simplified).
-                if re.match(rf"^.*\$\s*{re.escape(cmd)}\s*$", first_norm):
+                if any_prefix_re.match(first_norm):
                     lines.pop(i)
 
         return "\n".join(lines)
@@ -445,14 +622,10 @@ def _safe_b64decode(s: str) -> str:
     if not s:
         return ""
     try:
-        raw = base64.b64decode(s.encode("ascii"), validate=False)
-        return raw.decode("utf-8", errors="replace")
-    except (binascii.Error, UnicodeError):
-        try:
-            raw = base64.b64decode(s.encode("ascii"), validate=False)
-            return raw.decode("utf-8", errors="replace")
-        except Exception:
-            return ""
+        # b64decode takes the ASCII str directly; non-ASCII input raises ValueError.
+        return base64.b64decode(s, validate=False).decode("utf-8", errors="replace")
+    except (binascii.Error, ValueError):
+        return ""
 
 
 async def _append_pending_cmd_buffer(conversation_id: str, entry: Dict[str, Any]) -> None:
@@ -485,32 +658,115 @@ async def _append_pending_cmd_buffer(conversation_id: str, entry: Dict[str, Any]
     buffer["total_commands_run"] = buffer.get("total_commands_run", 0) + 1
     buffer["commands"].append(entry)
     if len(buffer["commands"]) > _CMD_BUFFER_MAX_ENTRIES:
-        buffer["commands"] = buffer["commands"][-_CMD_BUFFER_MAX_ENTRIES:]
+        del buffer["commands"][:-_CMD_BUFFER_MAX_ENTRIES]
     if shell_id:
         buffer["shell_id"] = shell_id
 
     meta["pending_cmd_buffer"] = buffer
     _save_conversation_meta(conversation_id, meta)
 
+# meta.json write-back cache. Loads are served from memory once a conversation's meta is
+# known to be on disk; saves after the first are coalesced and flushed (atomically) at most
+# every _META_FLUSH_INTERVAL_S. Loads return (and saves store) a private copy, so mutating a
+# loaded meta never reaches the cache until it is saved.
+_META_FLUSH_INTERVAL_S = 0.25
+_meta_cache: Dict[str, Dict[str, Any]] = {}
+_meta_dirty: set[str] = set()
+_meta_flush_task: Optional[asyncio.Task] = None
+
+
+def _write_conversation_meta_file(conversation_id: str, meta: Dict[str, Any]) -> None:
+    path = _conversation_meta_path(conversation_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if _orjson is not None:
+        tmp.write_bytes(_orjson.dumps(meta, option=_orjson.OPT_INDENT_2 | _orjson.OPT_NON_STR_KEYS))
+    else:
+        tmp.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _flush_conversation_meta() -> None:
+    """Write every dirty meta.json now."""
+    for cid in list(_meta_dirty):
+        _meta_dirty.discard(cid)
+        meta = _meta_cache.get(cid)
+        if meta is None:
+            continue
+        try:
+            _write_conversation_meta_file(cid, meta)
+        except Exception as e:
+            print(f"[meta] Failed to write meta for {cid}: {e}")
+
+
+async def _meta_flush_later() -> None:
+    await asyncio.sleep(_META_FLUSH_INTERVAL_S)
+    _flush_conversation_meta()
+
+
+def _forget_conversation_meta(conversation_id: str) -> None:
+    """Drop cached/pending meta and memoized paths (conversation directory is being deleted)."""
+    key = _sanitize_conversation_id(conversation_id)
+    _meta_cache.pop(key, None)
+    _meta_dirty.discard(key)
+    _transcript_pending.pop(_conversation_transcript_path(key), None)
+    _made_dirs.clear()
+    _agent_pty_transcript_offsets_dirty.discard(conversation_id)
+    _agent_pty_transcript_offsets_dirty.discard(key)
+    for fn in (
+        _conversation_dir,
+        _conversation_meta_path,
+        _conversation_transcript_path,
+        _user_pty_root,
+        _user_pty_raw_path,
+        _user_pty_marker_path,
+        _agent_pty_events_path,
+        _agent_pty_screen_events_path,
+        _agent_pty_raw_events_path,
+        _agent_pty_transcript_offset_path,
+    ):
+        fn.cache_clear()
+
+
 def _load_conversation_meta(conversation_id: str) -> Dict[str, Any]:
+    key = _sanitize_conversation_id(conversation_id)
+    cached = _meta_cache.get(key)
+    if cached is not None:
+        return copy.deepcopy(cached)
     path = _conversation_meta_path(conversation_id)
     if path.exists():
         try:
-            data = json.loads(path.read_text(encoding="utf-8"))
+            raw = path.read_bytes()
+            data = _json_loads(raw)
             if isinstance(data, dict):
-                return data
+                _meta_cache[key] = data
+                return copy.deepcopy(data)
         except Exception:
             pass
     meta = _default_conversation_meta(conversation_id)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
-    return meta
+    _write_conversation_meta_file(key, meta)
+    _meta_cache[key] = meta
+    return copy.deepcopy(meta)
 
 
 def _save_conversation_meta(conversation_id: str, meta: Dict[str, Any]) -> None:
-    path = _conversation_meta_path(conversation_id)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+    global _meta_flush_task
+    key = _sanitize_conversation_id(conversation_id)
+    known = key in _meta_cache
+    meta = copy.deepcopy(meta)
+    _meta_cache[key] = meta
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if not known or loop is None:
+        # First write creates the file synchronously (callers check meta.json exists()).
+        _meta_dirty.discard(key)
+        _write_conversation_meta_file(key, meta)
+        return
+    _meta_dirty.add(key)
+    if _meta_flush_task is None or _meta_flush_task.done():
+        _meta_flush_task = loop.create_task(_meta_flush_later(), name="conversation-meta-flush")
 
 
 # =============================================================================
@@ -527,15 +783,87 @@ _CMD_PREVIEW_MAX_LINES = 20
 _CMD_PREVIEW_MAX_BYTES = 3000
 
 
+def _read_tail_lines(path: str) -> Tuple[List[str], bool]:
+    """Preview tail of a file: (lines, truncated), paging in only what is kept.
+
+    Walks back from EOF with mmap.rfind(), counting raw line lengths against
+    _CMD_PREVIEW_MAX_BYTES / _CMD_PREVIEW_MAX_LINES, then decodes the accepted range once.
+    A last line longer than the byte cap is returned clipped to its final bytes.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm)
+            if mm[end - 1] == 0x0A:
+                end -= 1
+            start = line_end = end
+            total = count = 0
+            truncated = False
+            while count < _CMD_PREVIEW_MAX_LINES:
+                # Don't search further back than the longest line that could still fit.
+                lo = max(0, line_end - (_CMD_PREVIEW_MAX_BYTES - total) - 2)
+                nl = mm.rfind(b"\n", lo, line_end)
+                if nl < 0 and lo > 0:
+                    truncated = True
+                    break
+                n = line_end - nl - 1
+                if n and mm[line_end - 1] == 0x0D:
+                    n -= 1
+                if total + n > _CMD_PREVIEW_MAX_BYTES:
+                    truncated = True
+                    break
+                total += n
+                count += 1
+                start = nl + 1
+                if nl < 0:
+                    break
+                line_end = nl
+            if not count:
+                if mm[line_end - 1] == 0x0D:
+                    line_end -= 1
+                clip = line_end - _CMD_PREVIEW_MAX_BYTES
+                while clip < line_end and mm[clip] & 0xC0 == 0x80:  # don't start mid-character
+                    clip += 1
+                return [mm[clip:line_end].decode("utf-8", errors="replace")], True
+            lines = mm[start:end].decode("utf-8", errors="replace").split("\n")
+            return [line[:-1] if line.endswith("\r") else line for line in lines], truncated
+
+
+# conversation_id -> (shell_id.txt mtime_ns, shell_id); the file only changes on shell restart.
+_envelope_shell_id_cache: Dict[str, Tuple[int, str]] = {}
+
+
+# scrollback.snapshot.json path -> (mtime_ns, last _CMD_PREVIEW_MAX_LINES lines).
+_scrollback_tail_cache: Dict[Path, Tuple[int, List[str]]] = {}
+
+
+def _read_scrollback_tail(path: Path) -> List[str]:
+    """Preview tail of a scrollback snapshot, re-parsed only when the file changes."""
+    mtime_ns = path.stat().st_mtime_ns
+    cached = _scrollback_tail_cache.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        return list(cached[1])
+    data = _json_loads(path.read_bytes())
+    lines = data.get("lines", [])[-_CMD_PREVIEW_MAX_LINES:]
+    _scrollback_tail_cache[path] = (mtime_ns, lines)
+    return list(lines)
+
+
 def _get_shell_id_for_envelope(conversation_id: str) -> Optional[str]:
-    """Read shell_id from persisted file for meta envelope."""
+    """Read shell_id from persisted file for meta envelope (re-read only when it changes)."""
     path = _conversation_dir(conversation_id) / "agent_pty" / "shell_id.txt"
-    if path.exists():
-        try:
-            return path.read_text(encoding="utf-8").strip()
-        except Exception:
-            pass
-    return None
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+        cached = _envelope_shell_id_cache.get(conversation_id)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        shell_id = path.read_text(encoding="utf-8").strip()
+    except Exception:
+        _envelope_shell_id_cache.pop(conversation_id, None)
+        return None
+    _envelope_shell_id_cache[conversation_id] = (mtime_ns, shell_id)
+    return shell_id
 
 
 def _record_last_injected_meta_envelope(conversation_id: str, envelope_json: str, *, command_count: int) -> None:
@@ -547,7 +875,7 @@ def _record_last_injected_meta_envelope(conversation_id: str, envelope_json: str
         meta = _load_conversation_meta(conversation_id)
         debug = meta.get("debug") if isinstance(meta.get("debug"), dict) else {}
         debug["last_meta_envelope"] = {
-            "ts": int(datetime.now(timezone.utc).timestamp() * 1000),
+            "ts": time.time_ns() // 1_000_000,
             "command_count": int(command_count),
             "envelope_json": envelope_json,
         }
@@ -564,19 +892,20 @@ async def _build_cmd_preview(conversation_id: str, block: Optional[dict] = None)
     Uses the block's output_path for command-scoped output.
     Falls back to inline stdout or conversation-wide snapshot if output_path unavailable.
     """
-    def _read_block_output() -> List[str]:
-        """Sync helper to read block output file."""
+    def _read_block_output() -> Tuple[List[str], Optional[bool]]:
+        """Sync helper to read block output file.
+
+        Returns (lines, truncated); truncated is None when the byte cap still has to be applied.
+        """
         result: List[str] = []
         
-        # Try per-block output_path first (command-scoped)
+        # Try per-block output_path first (command-scoped); already capped by the tail walk.
+        # A readable file is authoritative, even if the command printed nothing.
         if block:
             output_path = block.get("output_path")
             if output_path:
                 try:
-                    text = Path(output_path).read_text(encoding="utf-8")
-                    lines = text.splitlines()[-_CMD_PREVIEW_MAX_LINES:]
-                    if lines:
-                        return lines
+                    return _read_tail_lines(output_path)
                 except Exception:
                     pass
             
@@ -585,39 +914,35 @@ async def _build_cmd_preview(conversation_id: str, block: Optional[dict] = None)
             if stdout:
                 lines = stdout.splitlines()[-_CMD_PREVIEW_MAX_LINES:]
                 if lines:
-                    return lines
+                    return lines, None
         
         # Last resort: conversation-wide scrollback (legacy/fallback)
         scrollback_path = _conversation_dir(conversation_id) / "agent_pty" / "scrollback.snapshot.json"
-        if scrollback_path.exists():
-            try:
-                data = json.loads(scrollback_path.read_text(encoding="utf-8"))
-                result = data.get("lines", [])[-_CMD_PREVIEW_MAX_LINES:]
-                if result:
-                    return result
-            except Exception:
-                pass
+        try:
+            result = _read_scrollback_tail(scrollback_path)
+            if result:
+                return result, None
+        except Exception:
+            pass
         
-        return result
+        return result, False
     
-    lines = await asyncio.to_thread(_read_block_output)
-    truncated = False
+    lines, truncated = await asyncio.to_thread(_read_block_output)
+    if truncated is not None:
+        return {"lines": lines, "truncated": truncated}
     
-    # Apply byte cap
+    # Apply byte cap (in-memory fallbacks only)
     total_bytes = 0
     capped_lines: List[str] = []
     for line in reversed(lines):
         line_bytes = len(line.encode("utf-8"))
         if total_bytes + line_bytes > _CMD_PREVIEW_MAX_BYTES:
-            truncated = True
             break
-        capped_lines.insert(0, line)
+        capped_lines.append(line)
         total_bytes += line_bytes
+    capped_lines.reverse()
     
-    if len(capped_lines) < len(lines):
-        truncated = True
-    
-    return {"lines": capped_lines, "truncated": truncated}
+    return {"lines": capped_lines, "truncated": len(capped_lines) < len(lines)}
 
 
 async def _buffer_cmd_context(conversation_id: str, block: dict) -> None:
@@ -629,16 +954,17 @@ async def _buffer_cmd_context(conversation_id: str, block: dict) -> None:
     exit_code = block.get("exit_code")
     cwd = block.get("cwd", "")
     block_id = block.get("block_id", "")
-    ts = block.get("ts_end") or block.get("ts_begin") or int(datetime.now(timezone.utc).timestamp() * 1000)
-    
-    shell_id = _get_shell_id_for_envelope(conversation_id)
-    preview = await _build_cmd_preview(conversation_id, block)
+    ts = block.get("ts_end") or block.get("ts_begin") or time.time_ns() // 1_000_000
     
     # The CODEX_META envelope is reserved for *user terminal* command context.
     # Skip buffering legacy agent blocks here (they can be read from transcript/blocks).
+    # Checked before any file reads: agent blocks end far more often than user ones.
     if not str(block_id or "").startswith("user:"):
         return
 
+    shell_id = _get_shell_id_for_envelope(conversation_id)
+    preview = await _build_cmd_preview(conversation_id, block)
+
     entry = {
         "cmd": cmd,
         "exit_code": exit_code,
@@ -677,7 +1003,7 @@ async def _buffer_cmd_context(conversation_id: str, block: dict) -> None:
     
     # Cap at max entries (drop oldest)
     if len(buffer["commands"]) > _CMD_BUFFER_MAX_ENTRIES:
-        buffer["commands"] = buffer["commands"][-_CMD_BUFFER_MAX_ENTRIES:]
+        del buffer["commands"][:-_CMD_BUFFER_MAX_ENTRIES]
     
     # Update shell_id if changed
     if shell_id:
@@ -704,7 +1030,10 @@ def _build_envelope_from_buffer(buffer: dict) -> str:
         "commands": buffer.get("commands", []),
         "mcp": ["pty_read_screen", "pty_read_scrollback"],
     }
-    return json.dumps(envelope, ensure_ascii=False)
+    if _orjson is not None:
+        # Compact UTF-8 straight from C; previews can be several KB of text.
+        return _orjson.dumps(envelope).decode("utf-8")
+    return json.dumps(envelope, ensure_ascii=False, separators=(",", ":"))
 
 
 def _strip_meta_envelope(text: str) -> str:
@@ -715,7 +1044,7 @@ def _strip_meta_envelope(text: str) -> str:
     displaying in frontend.
     """
     if text.startswith(_META_ENVELOPE_START):
-        end_idx = text.find(_META_ENVELOPE_END)
+        end_idx = text.find(_META_ENVELOPE_END, len(_META_ENVELOPE_START))
         if end_idx != -1:
             return text[end_idx + 1:]
     return text
@@ -739,36 +1068,66 @@ def _sanitize_transcript_item(item: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def _latest_legacy_transcript() -> Optional[Path]:
-    if not LEGACY_TRANSCRIPT_DIR.exists():
+    # Single pass for the newest file; no list, no sort.
+    best: Optional[str] = None
+    best_mtime = -1.0
+    try:
+        with os.scandir(LEGACY_TRANSCRIPT_DIR) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.name.endswith(".jsonl"):
+                    continue
+                mtime = entry.stat().st_mtime
+                if mtime > best_mtime:
+                    best_mtime, best = mtime, entry.path
+    except FileNotFoundError:
         return None
-    files = sorted(LEGACY_TRANSCRIPT_DIR.glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
-    return files[0] if files else None
+    return Path(best) if best else None
 
 
-async def _ensure_conversation(create_if_missing: bool = True) -> Optional[str]:
+async def _current_conversation_id() -> Optional[str]:
+    """Configured conversation id if its meta exists, else None."""
     async with _config_lock:
         cfg = _load_appserver_config()
         convo_id = cfg.get("conversation_id")
+    # A meta already in the write-back cache is known to be on disk, so the per-message
+    # call needs no stat().
+    if convo_id and (
+        _sanitize_conversation_id(convo_id) in _meta_cache
+        or _conversation_meta_path(convo_id).exists()
+    ):
+        return convo_id
+    return None
 
-    if convo_id and _conversation_meta_path(convo_id).exists():
+
+async def _ensure_conversation(create_if_missing: bool = True) -> Optional[str]:
+    convo_id = await _current_conversation_id()
+    if convo_id or not create_if_missing:
         return convo_id
+    async with _conversation_create_lock:
+        # Another caller may have created it while we waited.
+        convo_id = await _current_conversation_id()
+        if convo_id:
+            return convo_id
+        return await _create_conversation()
 
-    if not create_if_missing:
-        return None
 
-    convo_id = convo_id or uuid.uuid4().hex
+async def _create_conversation() -> str:
+    async with _config_lock:
+        convo_id = _load_appserver_config().get("conversation_id") or uuid.uuid4().hex
     meta = _default_conversation_meta(convo_id)
 
-    legacy = _latest_legacy_transcript()
-    if legacy and not _conversation_transcript_path(convo_id).exists():
-        try:
-            _conversation_transcript_path(convo_id).parent.mkdir(parents=True, exist_ok=True)
-            legacy.replace(_conversation_transcript_path(convo_id))
-            meta["thread_id"] = legacy.stem
-            meta["status"] = "active"
-        except Exception:
-            pass
+    def _adopt_legacy_transcript() -> None:
+        legacy = _latest_legacy_transcript()
+        if legacy and not _conversation_transcript_path(convo_id).exists():
+            try:
+                _conversation_transcript_path(convo_id).parent.mkdir(parents=True, exist_ok=True)
+                legacy.replace(_conversation_transcript_path(convo_id))
+                meta["thread_id"] = legacy.stem
+                meta["status"] = "active"
+            except Exception:
+                pass
 
+    await asyncio.to_thread(_adopt_legacy_transcript)
     _save_conversation_meta(convo_id, meta)
     async with _config_lock:
         cfg = _load_appserver_config()
@@ -826,8 +1185,11 @@ async def _set_turn_id(turn_id: Optional[str]) -> None:
         _save_appserver_config(cfg)
 
 
+_CONVERSATION_ID_UNSAFE_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
 def _sanitize_conversation_id(value: str) -> str:
-    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", value).strip("_")
+    safe = _CONVERSATION_ID_UNSAFE_RE.sub("_", value).strip("_")
     return safe or "unknown"
 
 
@@ -835,18 +1197,29 @@ def _transcript_path(conversation_id: str) -> Path:
     return _conversation_transcript_path(conversation_id)
 
 
+# Directories already created by this process, so hot write paths skip the mkdir() syscalls.
+# Cleared by _forget_conversation_meta (a conversation directory is being deleted).
+_made_dirs: set[Path] = set()
+
+
+def _ensure_parent_dir(path: Path) -> None:
+    parent = path.parent
+    if parent not in _made_dirs:
+        parent.mkdir(parents=True, exist_ok=True)
+        _made_dirs.add(parent)
+
+
 async def _write_transcript_entries(conversation_id: str, items: List[Dict[str, Any]]) -> None:
     if not conversation_id:
         return
     path = _transcript_path(conversation_id)
     path.parent.mkdir(parents=True, exist_ok=True)
+    # Full replace (rollout bind only); the live path is _append_transcript_entry.
+    await _flush_transcript_entries()
+    ts = utc_ts()
+    data = b"".join(_jsonl({"ts": ts, **entry}) for entry in items if isinstance(entry, dict))
     async with _transcript_lock:
-        with path.open("w", encoding="utf-8") as f:
-            for entry in items:
-                if not isinstance(entry, dict):
-                    continue
-                record = {"ts": utc_ts(), **entry}
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        await asyncio.to_thread(path.write_bytes, data)
 
 def _rollout_sessions_dir() -> Path:
     return Path(os.path.expanduser("~/.codex/sessions"))
@@ -907,38 +1280,73 @@ def _rollout_reasoning_text(payload: Dict[str, Any]) -> Optional[str]:
 
 
 def _rollout_extract_diff(payload: Any) -> Optional[str]:
-    if isinstance(payload, dict):
-        for key in ("diff", "unified_diff", "patch"):
-            value = payload.get(key)
-            if isinstance(value, str) and value.strip():
-                return value
-        for value in payload.values():
-            diff = _rollout_extract_diff(value)
-            if diff:
-                return diff
-    if isinstance(payload, list):
-        for value in payload:
-            diff = _rollout_extract_diff(value)
-            if diff:
-                return diff
+    # Pre-order DFS with an explicit stack (children pushed reversed to keep document order).
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key in ("diff", "unified_diff", "patch"):
+                value = node.get(key)
+                if isinstance(value, str) and value.strip():
+                    return value
+            stack.extend(reversed([v for v in node.values() if isinstance(v, (dict, list))]))
+        elif isinstance(node, list):
+            stack.extend(reversed([v for v in node if isinstance(v, (dict, list))]))
     return None
 
 
+# (rollout path, limit) -> parse state, so repeated previews of a growing rollout only parse
+# the lines appended since the last call. Bounded; least recently used entries are evicted.
+_ROLLOUT_PREVIEW_CACHE_MAX = 32
+# Larger limits (the bind path copies a whole rollout) are parsed without being cached.
+_ROLLOUT_PREVIEW_CACHE_MAX_ITEMS = 2000
+_rollout_preview_cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+
 def _rollout_preview_entries(path: Path, limit: int = 400) -> Dict[str, Any]:
-    items: List[Dict[str, Any]] = []
-    seen: set[tuple[str, str, Optional[int]]] = set()
-    token_total: Optional[int] = None
+    key = (str(path), limit)
     try:
-        with path.open("r", encoding="utf-8") as f:
-            for line in f:
+        st = path.stat()
+    except Exception:
+        return {"items": [], "token_total": None}
+    # Popped here and re-inserted on success: keeps LRU order, and a failed parse leaves no
+    # half-updated entry behind.
+    state = _rollout_preview_cache.pop(key, None)
+    if state is None or state["ino"] != st.st_ino or st.st_size < state["offset"]:
+        state = {"ino": st.st_ino, "offset": 0, "items": [], "seen": set(), "token_total": None}
+    if state["offset"] < st.st_size and len(state["items"]) < limit:
+        try:
+            _rollout_preview_parse(path, state, limit)
+        except Exception:
+            return {"items": [], "token_total": None}
+    if limit > _ROLLOUT_PREVIEW_CACHE_MAX_ITEMS:
+        return {"items": state["items"], "token_total": state["token_total"]}
+    _rollout_preview_cache[key] = state
+    while len(_rollout_preview_cache) > _ROLLOUT_PREVIEW_CACHE_MAX:
+        del _rollout_preview_cache[next(iter(_rollout_preview_cache))]
+    return {"items": list(state["items"]), "token_total": state["token_total"]}
+
+
+def _rollout_preview_parse(path: Path, state: Dict[str, Any], limit: int) -> None:
+    """Parse rollout lines from state["offset"] on, appending to the state's items."""
+    items: List[Dict[str, Any]] = state["items"]
+    seen: set[tuple[str, str, Optional[int]]] = state["seen"]
+    token_total: Optional[int] = state["token_total"]
+    try:
+        with path.open("rb") as f:
+            f.seek(state["offset"])
+            for raw in f:
                 if len(items) >= limit:
                     break
-                line = line.strip()
-                if not line:
-                    continue
+                line = raw.strip()
                 try:
-                    rec = json.loads(line)
+                    rec = _json_loads(line) if line else None
                 except Exception:
+                    if not raw.endswith(b"\n"):
+                        break  # last record still being written; retry it next call
+                    rec = None
+                state["offset"] += len(raw)
+                if rec is None:
                     continue
                 ts_bucket = _parse_rollout_timestamp(rec.get("timestamp"))
                 rtype = rec.get("type")
@@ -999,9 +1407,25 @@ def _rollout_preview_entries(path: Path, limit: int = 400) -> Dict[str, Any]:
                     if key not in seen:
                         seen.add(key)
                         items.append({"role": "diff", "text": diff, "ts": rec.get("timestamp")})
-    except Exception:
-        return {"items": [], "token_total": None}
-    return {"items": items, "token_total": token_total}
+    finally:
+        state["token_total"] = token_total
+
+def _collect_item_text_parts(item: Dict[str, Any], *fallback_keys: str) -> str:
+    """Join an item's content[].text parts, else its first string `text` / fallback key."""
+    content = item.get("content")
+    if isinstance(content, list):
+        text_parts = [
+            part["text"] for part in content
+            if isinstance(part, dict) and part.get("type") == "text" and isinstance(part.get("text"), str)
+        ]
+        if text_parts:
+            return "\n".join(text_parts)
+    for key in ("text", *fallback_keys):
+        value = item.get(key)
+        if isinstance(value, str):
+            return value
+    return ""
+
 
 def _extract_item_text(item: Dict[str, Any]) -> Optional[Dict[str, str]]:
     """Extract text from user/assistant message items.
@@ -1019,17 +1443,7 @@ def _extract_item_text(item: Dict[str, Any]) -> Optional[Dict[str, str]]:
     # Handle ResponseItem schema: type == "message" with role field
     if item_type == "message":
         role = str(item.get("role") or "").lower()
-        text_parts: List[str] = []
-        content = item.get("content") or []
-        if isinstance(content, list):
-            for part in content:
-                if isinstance(part, dict) and part.get("type") == "text":
-                    text = part.get("text")
-                    if isinstance(text, str):
-                        text_parts.append(text)
-        if not text_parts and isinstance(item.get("text"), str):
-            text_parts.append(item["text"])
-        text = "\n".join(text_parts)
+        text = _collect_item_text_parts(item)
         
         if role == "user":
             text = _strip_meta_envelope(text)  # Strip BEFORE .strip() (control chars)
@@ -1044,19 +1458,7 @@ def _extract_item_text(item: Dict[str, Any]) -> Optional[Dict[str, str]]:
     
     # Handle legacy usermessage schema
     if item_type in {"usermessage", "user_message"}:
-        text_parts: List[str] = []
-        content = item.get("content") or []
-        if isinstance(content, list):
-            for part in content:
-                if isinstance(part, dict) and part.get("type") == "text":
-                    text = part.get("text")
-                    if isinstance(text, str):
-                        text_parts.append(text)
-        if not text_parts and isinstance(item.get("text"), str):
-            text_parts.append(item["text"])
-        if not text_parts and isinstance(item.get("message"), str):
-            text_parts.append(item["message"])
-        text = "\n".join(text_parts)
+        text = _collect_item_text_parts(item, "message")
         text = _strip_meta_envelope(text)  # Strip BEFORE .strip() (control chars)
         text = text.strip()
         if text:
@@ -1096,36 +1498,6 @@ def _extract_reasoning_text(item: Dict[str, Any], fallback: Optional[str] = None
     return text or None
 
 
-def _extract_diff_text(payload: Any) -> Optional[str]:
-    if not isinstance(payload, dict):
-        return None
-    diff = payload.get("diff") or payload.get("patch") or payload.get("unified_diff")
-    if isinstance(diff, str) and diff.strip():
-        return diff
-    changes = payload.get("changes")
-    if isinstance(changes, list):
-        chunks: List[str] = []
-        for change in changes:
-            if not isinstance(change, dict):
-                continue
-            text = change.get("diff")
-            if isinstance(text, str) and text.strip():
-                chunks.append(text)
-        if chunks:
-            return "\n".join(chunks)
-    file_changes = payload.get("fileChanges")
-    if isinstance(file_changes, dict):
-        chunks = []
-        for _, change in file_changes.items():
-            if isinstance(change, dict):
-                text = change.get("diff") or change.get("patch")
-                if isinstance(text, str) and text.strip():
-                    chunks.append(text)
-        if chunks:
-            return "\n".join(chunks)
-    return None
-
-
 def _extract_diff_with_path(payload: Any) -> Tuple[Optional[str], Optional[str]]:
     """Extract diff text and file path from payload. Returns (diff_text, path)."""
     if not isinstance(payload, dict):
@@ -1172,11 +1544,16 @@ def _extract_diff_with_path(payload: Any) -> Tuple[Optional[str], Optional[str]]
     return None, None
 
 
+_DIFF_HEADER_LINE_RE = re.compile(r"^(?:diff --git |\+\+\+ |--- ).*", re.M)
+
+
 def _extract_path_from_diff(diff_text: str) -> Optional[str]:
     """Extract file path from diff headers like '--- a/README.md' or 'diff --git a/README.md b/README.md'."""
     if not diff_text:
         return None
-    for line in diff_text.splitlines():
+    # Jump straight to header lines instead of walking every line of the diff body.
+    for m in _DIFF_HEADER_LINE_RE.finditer(diff_text):
+        line = m.group(0)
         # Try diff --git header first
         if line.startswith("diff --git "):
             # Format: diff --git a/path b/path
@@ -1204,55 +1581,53 @@ def _extract_path_from_diff(diff_text: str) -> Optional[str]:
     return None
 
 
-def _diff_signature(diff_text: str) -> str:
+def _diff_signature(diff_text: str) -> int:
     if not diff_text:
-        return "empty"
-    files: List[str] = []
-    hunks: List[str] = []
-    for line in diff_text.splitlines():
-        if line.startswith("+++ ") or line.startswith("--- "):
-            files.append(line.strip())
-        elif line.startswith("@@"):
-            hunks.append(line.strip())
-    signature = "\n".join(files + hunks) + "\n" + diff_text
-    return hashlib.sha1(signature.encode("utf-8")).hexdigest()
+        return 0
+    # Dedupe key only (64-bit int: hashes/compares as one word). The file/hunk headers are
+    # part of diff_text, so hashing the text alone distinguishes the same diffs a header
+    # prefix would.
+    return int.from_bytes(hashlib.blake2b(diff_text.encode("utf-8"), digest_size=8).digest(), "big")
 
 
 # Thought block pattern: **<thought content>**
 _THOUGHT_PATTERN = re.compile(r'\*\*([^*]+)\*\*')
+# Streaming variant: pairs each ** with the next ** (content may contain single '*').
+_THOUGHT_STREAM_PATTERN = re.compile(r'\*\*(.*?)\*\*', re.DOTALL)
 
 
-def _extract_and_scrub_thoughts_stream(delta: str, state: Dict[str, Any]) -> Tuple[str, List[str]]:
+def _extract_and_scrub_thoughts_stream(delta: str, state: "_TurnState") -> Tuple[str, List[str]]:
     """
     Streaming thought extractor that handles **title** patterns across delta chunks.
     Returns (scrubbed_text, thoughts) and keeps any incomplete marker in state.
     """
     if not isinstance(delta, str) or not delta:
         return delta, []
-    buffer = state.get("thought_buffer", "")
+    buffer = state.thought_buffer
     text = buffer + delta
+    state.thought_buffer = ""
+    if "*" not in text:
+        # Most deltas carry no markers at all.
+        return text, []
     thoughts: List[str] = []
     scrubbed_parts: List[str] = []
     idx = 0
-    state["thought_buffer"] = ""
-    while True:
-        start = text.find("**", idx)
-        if start == -1:
-            scrubbed_parts.append(text[idx:])
-            break
+    for m in _THOUGHT_STREAM_PATTERN.finditer(text):
+        scrubbed_parts.append(text[idx:m.start()])
+        if m.group(1):
+            thoughts.append(m.group(1))
+        idx = m.end()
+    # An unpaired ** after the last match is held back until its closer arrives.
+    start = text.find("**", idx)
+    if start == -1:
+        scrubbed_parts.append(text[idx:])
+    else:
         scrubbed_parts.append(text[idx:start])
-        end = text.find("**", start + 2)
-        if end == -1:
-            state["thought_buffer"] = text[start:]
-            break
-        content = text[start + 2:end]
-        if content:
-            thoughts.append(content)
-        idx = end + 2
+        state.thought_buffer = text[start:]
     scrubbed = "".join(scrubbed_parts)
     # If we ended on a single trailing '*', keep it for the next delta.
-    if not state["thought_buffer"] and text.endswith("*") and not text.endswith("**"):
-        state["thought_buffer"] = "*"
+    if not state.thought_buffer and text.endswith("*") and not text.endswith("**"):
+        state.thought_buffer = "*"
         if scrubbed.endswith("*"):
             scrubbed = scrubbed[:-1]
     return scrubbed, thoughts
@@ -1304,48 +1679,94 @@ def _get_item_id(payload: Any) -> Optional[str]:
     return None
 
 
-def _get_turn_state(thread_id: Optional[str], turn_id: Optional[str]) -> Dict[str, Any]:
+_DIFF_HASHES_MAX = 1024
+
+
+def _lru_seen(seen: Dict[Any, None], key: Any, max_entries: int) -> bool:
+    """Return True if key is in the LRU dict (refreshing it); otherwise record it, evicting the oldest."""
+    if key in seen:
+        del seen[key]
+        seen[key] = None
+        return True
+    seen[key] = None
+    if len(seen) > max_entries:
+        del seen[next(iter(seen))]
+    return False
+
+
+class _TurnState:
+    """Streaming bookkeeping for one (thread, turn); items registered to it share the instance."""
+
+    __slots__ = (
+        "msg_source",
+        "reason_source",
+        "assistant_id",
+        "reasoning_id",
+        "assistant_started",
+        "reasoning_started",
+        "reasoning_buffer",
+        "thought_buffer",
+        "diff_hashes",
+        "diff_seen",
+        "plan_steps",
+    )
+
+    def __init__(self) -> None:
+        self.msg_source: Optional[str] = None
+        self.reason_source: Optional[str] = None
+        self.assistant_id: Optional[str] = None
+        self.reasoning_id: Optional[str] = None
+        self.assistant_started = False
+        self.reasoning_started = False
+        self.reasoning_buffer = ""
+        self.thought_buffer = ""
+        self.diff_hashes: Dict[int, None] = {}  # _diff_signature values, LRU via _lru_seen
+        self.diff_seen = False
+        self.plan_steps: List[Dict[str, Any]] = []  # Accumulate plan steps during turn
+
+
+def _lru_put(cache: Dict[Any, Any], key: Any, value: Any, max_entries: int) -> None:
+    """Store key as the most recent entry of the LRU dict, evicting the oldest past max_entries."""
+    cache.pop(key, None)
+    cache[key] = value
+    if len(cache) > max_entries:
+        del cache[next(iter(cache))]
+
+
+def _get_turn_state(thread_id: Optional[str], turn_id: Optional[str]) -> _TurnState:
     key = f"{thread_id or 'unknown'}:{turn_id or 'unknown'}"
     state = _appserver_turn_state.get(key)
-    if not state:
-        state = {
-            "msg_source": None,
-            "reason_source": None,
-            "assistant_id": None,
-            "reasoning_id": None,
-            "assistant_started": False,
-            "reasoning_started": False,
-            "assistant_buffer": "",
-            "reasoning_buffer": "",
-            "thought_buffer": "",
-            "diff_hashes": set(),
-            "diff_seen": False,
-            "plan_steps": [],  # Accumulate plan steps during turn
-        }
+    if state is None:
+        state = _TurnState()
         _appserver_turn_state[key] = state
     return state
 
 
+# Payload keys that carry a tool event's id, in precedence order.
+_TOOL_ID_KEYS = ("itemId", "item_id", "id", "call_id", "tool_call_id", "command_id")
+
+
 def _tool_event_id(label: str, payload: Dict[str, Any], thread_id: Optional[str], turn_id: Optional[str]) -> str:
-    base = payload.get("itemId") or payload.get("item_id") or payload.get("id") or payload.get("call_id") or payload.get("tool_call_id") or payload.get("command_id")
-    if base:
-        return str(base)
+    for key in _TOOL_ID_KEYS:
+        base = payload.get(key)
+        if base:
+            return str(base)
     return f"{label}:{thread_id or 'unknown'}:{turn_id or 'unknown'}"
 
 
-def _get_state_for_item(thread_id: Optional[str], turn_id: Optional[str], item_id: Optional[str]) -> Dict[str, Any]:
+def _get_state_for_item(thread_id: Optional[str], turn_id: Optional[str], item_id: Optional[str]) -> _TurnState:
     if item_id and item_id in _appserver_item_state:
         return _appserver_item_state[item_id]
     return _get_turn_state(thread_id, turn_id)
 
 
-def _register_item_state(item_id: Optional[str], state: Dict[str, Any]) -> None:
+def _register_item_state(item_id: Optional[str], state: _TurnState) -> None:
     if item_id:
         _appserver_item_state[item_id] = state
 
 
 async def _emit_diff_event(
-    state: Dict[str, Any],
+    state: _TurnState,
     diff: Optional[str],
     conversation_id: Optional[str],
     thread_id: Optional[str],
@@ -1360,18 +1781,17 @@ async def _emit_diff_event(
     diff_text = diff.strip()
     if not diff_text:
         return
-    diff_hashes = state.setdefault("diff_hashes", set())
     diff_hash = _diff_signature(diff_text)
-    if diff_hash in diff_hashes:
+    if _lru_seen(state.diff_hashes, diff_hash, _DIFF_HASHES_MAX):
         return
-    diff_hashes.add(diff_hash)
-    state["diff_seen"] = True
+    state.diff_seen = True
+    short_hash = f"{diff_hash:016x}"[:12]
     if thread_id or turn_id:
-        diff_id = f"{thread_id or 'unknown'}:{turn_id or 'unknown'}:{diff_hash[:12]}"
+        diff_id = f"{thread_id or 'unknown'}:{turn_id or 'unknown'}:{short_hash}"
     elif item_id:
-        diff_id = f"item:{item_id}:{diff_hash[:12]}"
+        diff_id = f"item:{item_id}:{short_hash}"
     else:
-        diff_id = f"diff:{diff_hash[:12]}"
+        diff_id = f"diff:{short_hash}"
     events.append({"type": "diff", "id": diff_id, "text": diff_text, "path": path})
     if record_transcript and conversation_id:
         await _append_transcript_entry(conversation_id, {
@@ -1383,24 +1803,87 @@ async def _emit_diff_event(
         })
 
 
+def _write_transcript_batches(batches: Dict[Path, List[bytes]]) -> None:
+    for path, lines in batches.items():
+        try:
+            _ensure_parent_dir(path)
+            # One O_APPEND write per batch: whole lines even with other appenders.
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            except FileNotFoundError:
+                # Directory removed since we created it; make it again.
+                _made_dirs.discard(path.parent)
+                _ensure_parent_dir(path)
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b"".join(lines))
+            finally:
+                os.close(fd)
+        except Exception as e:
+            print(f"[transcript] Failed to append to {path}: {e}")
+
+
+def _take_transcript_pending() -> Dict[Path, List[bytes]]:
+    global _transcript_pending, _transcript_pending_bytes
+    batches = _transcript_pending
+    _transcript_pending = {}
+    _transcript_pending_bytes = 0
+    _transcript_flush_now.clear()
+    return batches
+
+
+async def _flush_transcript_entries() -> None:
+    """Write all pending transcript lines now."""
+    async with _transcript_lock:
+        batches = _take_transcript_pending()
+        if batches:
+            await asyncio.to_thread(_write_transcript_batches, batches)
+
+
+def _flush_transcript_entries_sync() -> None:
+    """Shutdown variant of _flush_transcript_entries (no event loop hop)."""
+    batches = _take_transcript_pending()
+    if batches:
+        _write_transcript_batches(batches)
+
+
+async def _transcript_flush_later() -> None:
+    # Loops so lines appended while a batch is being written aren't left waiting for the
+    # next append to schedule a flush.
+    while _transcript_pending:
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_transcript_flush_now.wait(), _TRANSCRIPT_FLUSH_INTERVAL_S)
+        await _flush_transcript_entries()
+
+
+def _request_transcript_flush() -> None:
+    """Write pending transcript lines now rather than after the batch interval (turn boundaries)."""
+    if _transcript_pending:
+        _transcript_flush_now.set()
+
+
 async def _append_transcript_entry(conversation_id: str, entry: Dict[str, Any]) -> None:
+    global _transcript_pending_bytes, _transcript_flush_task
     if not conversation_id:
         return
-    path = _transcript_path(conversation_id)
-    path.parent.mkdir(parents=True, exist_ok=True)
+    item_id = entry.get("item_id")
+    role = entry.get("role")
+    if item_id and role:
+        if _lru_seen(_transcript_seen, (conversation_id, str(item_id), str(role)), _TRANSCRIPT_SEEN_MAX):
+            return
     record = {"ts": utc_ts(), **entry}
-    async with _transcript_lock:
-        item_id = entry.get("item_id")
-        role = entry.get("role")
-        if item_id and role:
-            key = (conversation_id, str(item_id), str(role))
-            if key in _transcript_seen:
-                return
-            _transcript_seen.add(key)
-        with path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    line = _jsonl(record)
+    _transcript_pending.setdefault(_transcript_path(conversation_id), []).append(line)
+    _transcript_pending_bytes += len(line)
+    if _transcript_pending_bytes >= _TRANSCRIPT_FLUSH_MAX_BYTES:
+        _transcript_flush_now.set()
+    if _transcript_flush_task is None or _transcript_flush_task.done():
+        _transcript_flush_task = asyncio.get_running_loop().create_task(
+            _transcript_flush_later(), name="transcript-flush"
+        )
 
 
+@functools.lru_cache(maxsize=1024)
 def _agent_pty_transcript_offset_path(conversation_id: str) -> Path:
     """Path to persisted transcript offset for agent PTY events."""
     safe_id = _sanitize_conversation_id(conversation_id)
@@ -1422,45 +1905,156 @@ def _save_agent_pty_transcript_offset(conversation_id: str, offset: int) -> None
     """Persist transcript offset to disk."""
     path = _agent_pty_transcript_offset_path(conversation_id)
     try:
-        path.parent.mkdir(parents=True, exist_ok=True)
+        _ensure_parent_dir(path)
         path.write_text(str(offset))
     except Exception:
         pass
 
 
+# Transcript offsets live in _agent_pty_transcript_offsets; changed ones are checkpointed to
+# disk at most every _AGENT_PTY_OFFSET_FLUSH_INTERVAL_S (and at shutdown) instead of per tick.
+# A crash can only make the offset lag, i.e. re-read a few already mirrored events.
+_AGENT_PTY_OFFSET_FLUSH_INTERVAL_S = 5.0
+_agent_pty_transcript_offsets_dirty: set[str] = set()
+_agent_pty_offset_flush_task: Optional[asyncio.Task] = None
+
+
+def _flush_agent_pty_transcript_offsets() -> None:
+    """Write every changed transcript offset now."""
+    dirty = list(_agent_pty_transcript_offsets_dirty)
+    _agent_pty_transcript_offsets_dirty.clear()
+    for conversation_id in dirty:
+        offset = _agent_pty_transcript_offsets.get(conversation_id)
+        if offset is not None:
+            _save_agent_pty_transcript_offset(conversation_id, offset)
+
+
+async def _agent_pty_offset_flush_later() -> None:
+    await asyncio.sleep(_AGENT_PTY_OFFSET_FLUSH_INTERVAL_S)
+    await asyncio.to_thread(_flush_agent_pty_transcript_offsets)
+
+
+# Upper bound on one tailer read; a busy log is drained over several ticks.
+_TAIL_READ_MAX_BYTES = 1024 * 1024
+
+
+def _read_complete_lines(path: Path, offset: int) -> Tuple[int, bytes]:
+    """Complete lines appended to `path` since byte `offset` (worker-thread side of the tailers).
+
+    Returns (start, data): start is the offset actually read from (0 if the file shrank) and
+    data ends on a newline, so a partially written last line is picked up on a later read.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < offset:
+            offset = 0
+        if size == offset:
+            return offset, b""
+        f.seek(offset)
+        data = f.read(min(size - offset, _TAIL_READ_MAX_BYTES))
+    end = data.rfind(b"\n")
+    if end < 0 and len(data) == _TAIL_READ_MAX_BYTES:
+        # A single line larger than the read window; hand it over rather than stall.
+        return offset, data
+    return offset, data[:end + 1]
+
+
+def _read_complete_lines_batch(reads: List[Tuple[Path, int]]) -> List[Tuple[int, bytes]]:
+    """_read_complete_lines for several (path, offset) pairs in one worker-thread hop.
+
+    A file that can't be read (typically not created yet) comes back empty at its offset.
+    """
+    out: List[Tuple[int, bytes]] = []
+    for path, offset in reads:
+        try:
+            out.append(_read_complete_lines(path, offset))
+        except OSError:
+            out.append((offset, b""))
+    return out
+
+
+def _iter_jsonl_records(data: bytes, max_records: int = -1) -> Iterator[Tuple[int, Any]]:
+    """Parse the JSONL records in `data` (as returned by _read_complete_lines).
+
+    Yields (end, record): end is the offset in `data` just past the record's newline, record
+    is None for a line that doesn't parse. Lines are found with bytes.find and, with orjson,
+    parsed from memoryview slices, so no per-line bytes/str copies are made. Bytes after the
+    last newline (an oversized line) count as one final, consumed record.
+    """
+    view = memoryview(data) if _orjson is not None else data
+    size = len(data)
+    pos = 0
+    while pos < size and max_records != 0:
+        max_records -= 1
+        nl = data.find(b"\n", pos)
+        end = size if nl < 0 else nl
+        line = view[pos:end]
+        pos = end + 1 if nl >= 0 else size
+        try:
+            record = _json_loads(line) if line else None
+        except Exception:
+            record = None
+        yield pos, record
+
+
+_TAIL_POLL_INTERVAL_S = 0.2
+
+
+async def _watch_file_appends(*paths: Path) -> AsyncIterator[None]:
+    """Yield once up front, then whenever any of `paths` (all in one directory) may have grown.
+
+    Blocks on inotify/kqueue via watchfiles when it is installed, with one watch on the shared
+    directory; its 1s timeout tick doubles as a safety net for appends that land before the
+    watcher is armed. Without watchfiles (or while the directory doesn't exist yet) this
+    degrades to polling, as it does for good if the watcher fails (e.g. inotify watch limit).
+    """
+    yield
+    parent = paths[0].parent
+    targets = {str(path) for path in paths}
+    use_watcher = _awatch is not None
+    while True:
+        if use_watcher and parent.is_dir():
+            try:
+                async for _changes in _awatch(
+                    parent,
+                    watch_filter=lambda _change, changed: changed in targets,
+                    step=20,
+                    debounce=200,
+                    rust_timeout=1000,
+                    yield_on_timeout=True,
+                ):
+                    yield
+            except Exception as e:
+                print(f"[tail] File watcher for {parent} failed, polling instead: {e}")
+                use_watcher = False
+        await asyncio.sleep(_TAIL_POLL_INTERVAL_S)
+        yield
+
+
 async def _tail_agent_pty_events_to_transcript(conversation_id: str, *, max_lines_per_tick: int = 50) -> None:
     """Best-effort: mirror agent PTY block events into transcript SSOT for replay.
 
     Reads from conversations/<id>/agent_pty/events.jsonl and writes a compact entry to transcript.jsonl.
-    Offset is persisted to disk to survive server restarts.
+    Offset is checkpointed to disk (every few seconds and at shutdown) to survive server restarts.
     Also buffers command context for meta envelope injection on next user message.
     """
+    global _agent_pty_offset_flush_task
     if not conversation_id:
         return
     path = _agent_pty_events_path(conversation_id)
-    if not path.exists():
-        return
-    try:
-        data = await asyncio.to_thread(path.read_text, encoding="utf-8", errors="replace")
-    except Exception:
-        return
-    raw = data.encode("utf-8", errors="replace")
     # Load offset from memory cache or disk
     offset = _agent_pty_transcript_offsets.get(conversation_id)
     if offset is None:
         offset = _load_agent_pty_transcript_offset(conversation_id)
         _agent_pty_transcript_offsets[conversation_id] = offset
-    if offset > len(raw):
-        offset = 0
-    tail = raw[offset:]
+    try:
+        offset, tail = await asyncio.to_thread(_read_complete_lines, path, offset)
+    except Exception:
+        return
     if not tail:
         return
-    lines = tail.splitlines()[:max_lines_per_tick]
-    for line in lines:
-        try:
-            evt = json.loads(line.decode("utf-8", errors="replace"))
-        except Exception:
-            continue
+    consumed = 0
+    for consumed, evt in _iter_jsonl_records(tail, max_lines_per_tick):
         if not isinstance(evt, dict):
             continue
         etype = evt.get("type")
@@ -1489,11 +2083,23 @@ async def _tail_agent_pty_events_to_transcript(conversation_id: str, *, max_line
         await _append_transcript_entry(conversation_id, payload)
         # Note: do not synthesize additional shell_* transcript rows from agent PTY blocks.
         # It duplicates output and makes compound commands appear as multiple commands.
-    consumed = b"\n".join(lines)
-    new_offset = offset + len(consumed) + (1 if lines else 0)
-    _agent_pty_transcript_offsets[conversation_id] = new_offset
-    # Persist to disk
-    _save_agent_pty_transcript_offset(conversation_id, new_offset)
+    _agent_pty_transcript_offsets[conversation_id] = offset + consumed
+    # Persisted by the checkpoint task, not on every tick.
+    _agent_pty_transcript_offsets_dirty.add(conversation_id)
+    if _agent_pty_offset_flush_task is None or _agent_pty_offset_flush_task.done():
+        _agent_pty_offset_flush_task = asyncio.create_task(
+            _agent_pty_offset_flush_later(), name="agent-pty-offset-flush"
+        )
+
+
+# Labels _maybe_capture_transcript records -> (event name stored, role captured or None for
+# any, item must be under payload["item"]). Anything else is a single dict miss.
+_TRANSCRIPT_CAPTURE_LABELS: Dict[str, Tuple[str, Optional[str], bool]] = {
+    "item/started": ("item/started", "user", False),
+    "item/completed": ("item/completed", "assistant", False),
+    "codex/event/item_started": ("item_started", None, True),
+    "codex/event/item_completed": ("item_completed", None, True),
+}
 
 
 async def _maybe_capture_transcript(
@@ -1502,53 +2108,25 @@ async def _maybe_capture_transcript(
     conversation_id: Optional[str],
     raw: Any = None,
 ) -> None:
-    if not conversation_id:
+    if not conversation_id or not label or not isinstance(payload, dict):
         return
-    if not label:
+    spec = _TRANSCRIPT_CAPTURE_LABELS.get(label) or _TRANSCRIPT_CAPTURE_LABELS.get(label.lower())
+    if spec is None:
         return
-    label_norm = label.lower()
-    item = None
-    if isinstance(payload, dict) and "item" in payload:
-        item = payload.get("item")
-    elif isinstance(payload, dict):
-        item = payload
+    event, role, nested_only = spec
+    item = payload.get("item") if nested_only or "item" in payload else payload
     if not isinstance(item, dict):
         return
-    if label_norm == "item/started":
-        entry = _extract_item_text(item)
-        if entry and entry["role"] == "user":
-            await _append_transcript_entry(conversation_id, {
-                "role": entry["role"],
-                "text": entry["text"],
-                "item_id": item.get("id"),
-                "event": label_norm,
-            })
-        return
-    if label_norm == "item/completed":
-        entry = _extract_item_text(item)
-        if entry and entry["role"] == "assistant":
-            await _append_transcript_entry(conversation_id, {
-                "role": entry["role"],
-                "text": entry["text"],
-                "item_id": item.get("id"),
-                "event": label_norm,
-            })
-        # Reasoning is stored via codex/event/agent_reasoning (like messages via agent_message)
+    # Reasoning is stored via codex/event/agent_reasoning (like messages via agent_message)
+    entry = _extract_item_text(item)
+    if not entry or (role is not None and entry["role"] != role):
         return
-    if label_norm.startswith("codex/event/"):
-        event_type = label_norm.split("codex/event/", 1)[-1]
-        if event_type in {"item_started", "item_completed"} and isinstance(payload, dict):
-            item_payload = payload.get("item")
-            if isinstance(item_payload, dict):
-                entry = _extract_item_text(item_payload)
-                if entry:
-                    await _append_transcript_entry(conversation_id, {
-                        "role": entry["role"],
-                        "text": entry["text"],
-                        "item_id": item_payload.get("id"),
-                        "event": event_type,
-                    })
-                # Reasoning is stored via codex/event/agent_reasoning (like messages via agent_message)
+    await _append_transcript_entry(conversation_id, {
+        "role": entry["role"],
+        "text": entry["text"],
+        "item_id": item.get("id"),
+        "event": event,
+    })
 
 
 def _ensure_framework_shells_secret() -> None:
@@ -1565,9 +2143,9 @@ def _ensure_framework_shells_secret() -> None:
     base_dir = Path(os.path.expanduser("~/.cache/framework_shells"))
     secret_dir = base_dir / "runtimes" / fingerprint
     secret_file = secret_dir / "secret"
-    if secret_file.exists():
+    try:
         secret = secret_file.read_text(encoding="utf-8").strip()
-    else:
+    except FileNotFoundError:
         secret_dir.mkdir(parents=True, exist_ok=True)
         secret = secrets.token_hex(32)
         secret_file.write_text(secret, encoding="utf-8")
@@ -1781,34 +2359,36 @@ async def _terminate_agent_pty_conversation_shells(*, force: bool = True) -> Dic
             pass
     return {"ok": True, "terminated": terminated}
 
-async def _broadcast_appserver_ui(event: Dict[str, Any]) -> None:
-    if not _appserver_ws_clients_ui:
-        # still try socket.io
-        try:
-            await socketio_server.emit("appserver_event", event, namespace="/appserver")
-        except Exception:
-            pass
-        return
-    data = json.dumps(event, ensure_ascii=False)
-    stale: List[WebSocket] = []
-    for ws in _appserver_ws_clients_ui:
-        try:
-            await ws.send_text(data)
-        except Exception:
-            stale.append(ws)
-    for ws in stale:
-        with suppress(Exception):
-            _appserver_ws_clients_ui.remove(ws)
+async def _send_text_to_clients(clients: set[WebSocket], data: str) -> None:
+    """Send `data` to all clients concurrently (one slow socket doesn't delay the rest); drop failed ones."""
+    targets = list(clients)
+    results = await asyncio.gather(*(ws.send_text(data) for ws in targets), return_exceptions=True)
+    for ws, result in zip(targets, results):
+        if isinstance(result, Exception):
+            clients.discard(ws)
+
+
+async def _emit_appserver_socketio(event: Dict[str, Any]) -> None:
     try:
         await socketio_server.emit("appserver_event", event, namespace="/appserver")
     except Exception:
         pass
 
 
+async def _broadcast_appserver_ui(event: Dict[str, Any]) -> None:
+    if not _appserver_ws_clients_ui:
+        # still try socket.io
+        await _emit_appserver_socketio(event)
+        return
+    data = _json_text(event)
+    await asyncio.gather(
+        _send_text_to_clients(_appserver_ws_clients_ui, data),
+        _emit_appserver_socketio(event),
+    )
+
+
 async def _broadcast_appserver_raw(message: str) -> None:
     _appserver_raw_buffer.append(message)
-    if len(_appserver_raw_buffer) > 500:
-        _appserver_raw_buffer[:] = _appserver_raw_buffer[-500:]
     # Write to debug log file if enabled
     if DEBUG_MODE and DEBUG_RAW_LOG_PATH:
         try:
@@ -1818,32 +2398,28 @@ async def _broadcast_appserver_raw(message: str) -> None:
             pass
     if not _appserver_ws_clients_raw:
         return
-    stale: List[WebSocket] = []
-    for ws in _appserver_ws_clients_raw:
-        try:
-            await ws.send_text(message)
-        except Exception:
-            stale.append(ws)
-    for ws in stale:
-        with suppress(Exception):
-            _appserver_ws_clients_raw.remove(ws)
+    await _send_text_to_clients(_appserver_ws_clients_raw, message)
 
 
+@functools.lru_cache(maxsize=1024)
 def _agent_pty_events_path(conversation_id: str) -> Path:
     safe_id = _sanitize_conversation_id(conversation_id)
     return _conversation_dir(safe_id) / "agent_pty" / "events.jsonl"
 
 
+@functools.lru_cache(maxsize=1024)
 def _agent_pty_screen_events_path(conversation_id: str) -> Path:
     safe_id = _sanitize_conversation_id(conversation_id)
     return _conversation_dir(safe_id) / "agent_pty" / "screen.jsonl"
 
+@functools.lru_cache(maxsize=1024)
 def _agent_pty_raw_events_path(conversation_id: str) -> Path:
     safe_id = _sanitize_conversation_id(conversation_id)
     return _conversation_dir(safe_id) / "agent_pty" / "raw_events.jsonl"
 
 
 async def _ensure_agent_pty_event_tailer(conversation_id: str) -> None:
+    """Forward new agent PTY events (events / screen / raw jsonl) to the UI, one task per conversation."""
     if not conversation_id:
         return
     existing = _agent_pty_event_tasks.get(conversation_id)
@@ -1851,33 +2427,31 @@ async def _ensure_agent_pty_event_tailer(conversation_id: str) -> None:
         return
 
     async def _tail() -> None:
-        path = _agent_pty_events_path(conversation_id)
-        while True:
+        paths = (
+            _agent_pty_events_path(conversation_id),
+            _agent_pty_screen_events_path(conversation_id),
+            _agent_pty_raw_events_path(conversation_id),
+        )
+        async for _ in _watch_file_appends(*paths):
             try:
-                if not path.exists():
-                    await asyncio.sleep(0.5)
-                    continue
-                data = await asyncio.to_thread(path.read_text, encoding="utf-8", errors="replace")
-                # Track byte offsets (best-effort) to avoid rebroadcast loops.
-                raw_bytes = data.encode("utf-8", errors="replace")
-                offset = _agent_pty_ws_offsets.get(conversation_id, 0)
-                if offset > len(raw_bytes):
-                    offset = 0
-                tail = raw_bytes[offset:]
-                if not tail:
-                    await asyncio.sleep(0.2)
-                    continue
-                for line in tail.splitlines():
-                    try:
-                        event = json.loads(line.decode("utf-8", errors="replace"))
-                    except Exception:
-                        continue
-                    # Forward as-is to the UI websocket stream ONLY.
-                    # Transcript writing is handled separately by _tail_agent_pty_events_to_transcript
-                    # which uses its own offset tracking to avoid duplicates.
-                    if isinstance(event, dict):
-                        await _broadcast_appserver_ui(event)
-                _agent_pty_ws_offsets[conversation_id] = len(raw_bytes)
+                # Drain everything appended since the last wakeup (reads are size-capped).
+                while True:
+                    # Track byte offsets to avoid rebroadcast loops; only new complete lines are read.
+                    reads = await asyncio.to_thread(
+                        _read_complete_lines_batch, [(path, _agent_pty_ws_offsets.get(path, 0)) for path in paths]
+                    )
+                    if not any(tail for _, tail in reads):
+                        break
+                    for path, (offset, tail) in zip(paths, reads):
+                        if not tail:
+                            continue
+                        for _, event in _iter_jsonl_records(tail):
+                            # Forward as-is to the UI websocket stream ONLY.
+                            # Transcript writing is handled separately by _tail_agent_pty_events_to_transcript
+                            # which uses its own offset tracking to avoid duplicates.
+                            if isinstance(event, dict):
+                                await _broadcast_appserver_ui(event)
+                        _agent_pty_ws_offsets[path] = offset + len(tail)
             except asyncio.CancelledError:
                 raise
             except Exception:
@@ -1886,86 +2460,6 @@ async def _ensure_agent_pty_event_tailer(conversation_id: str) -> None:
     _agent_pty_event_tasks[conversation_id] = asyncio.create_task(_tail(), name=f"agent-pty-events:{conversation_id}")
 
 
-async def _ensure_agent_pty_screen_event_tailer(conversation_id: str) -> None:
-    if not conversation_id:
-        return
-    existing = _agent_pty_screen_event_tasks.get(conversation_id)
-    if existing and not existing.done():
-        return
-
-    async def _tail() -> None:
-        path = _agent_pty_screen_events_path(conversation_id)
-        while True:
-            try:
-                if not path.exists():
-                    await asyncio.sleep(0.5)
-                    continue
-                raw_bytes = await asyncio.to_thread(path.read_bytes)
-                offset = _agent_pty_screen_ws_offsets.get(conversation_id, 0)
-                if offset > len(raw_bytes):
-                    offset = 0
-                tail = raw_bytes[offset:]
-                if not tail:
-                    await asyncio.sleep(0.2)
-                    continue
-                for line in tail.splitlines():
-                    try:
-                        event = json.loads(line.decode("utf-8", errors="replace"))
-                    except Exception:
-                        continue
-                    if isinstance(event, dict):
-                        await _broadcast_appserver_ui(event)
-                _agent_pty_screen_ws_offsets[conversation_id] = len(raw_bytes)
-            except asyncio.CancelledError:
-                raise
-            except Exception:
-                await asyncio.sleep(0.5)
-
-    _agent_pty_screen_event_tasks[conversation_id] = asyncio.create_task(
-        _tail(), name=f"agent-pty-screen:{conversation_id}"
-    )
-
-
-async def _ensure_agent_pty_raw_event_tailer(conversation_id: str) -> None:
-    if not conversation_id:
-        return
-    existing = _agent_pty_raw_event_tasks.get(conversation_id)
-    if existing and not existing.done():
-        return
-
-    async def _tail() -> None:
-        path = _agent_pty_raw_events_path(conversation_id)
-        while True:
-            try:
-                if not path.exists():
-                    await asyncio.sleep(0.5)
-                    continue
-                raw_bytes = await asyncio.to_thread(path.read_bytes)
-                offset = _agent_pty_raw_ws_offsets.get(conversation_id, 0)
-                if offset > len(raw_bytes):
-                    offset = 0
-                tail = raw_bytes[offset:]
-                if not tail:
-                    await asyncio.sleep(0.2)
-                    continue
-                for line in tail.splitlines():
-                    try:
-                        event = json.loads(line.decode("utf-8", errors="replace"))
-                    except Exception:
-                        continue
-                    if isinstance(event, dict):
-                        await _broadcast_appserver_ui(event)
-                _agent_pty_raw_ws_offsets[conversation_id] = len(raw_bytes)
-            except asyncio.CancelledError:
-                raise
-            except Exception:
-                await asyncio.sleep(0.5)
-
-    _agent_pty_raw_event_tasks[conversation_id] = asyncio.create_task(
-        _tail(), name=f"agent-pty-raw:{conversation_id}"
-    )
-
-
 async def _agent_pty_monitor_loop() -> None:
     while True:
         try:
@@ -1977,8 +2471,6 @@ async def _agent_pty_monitor_loop() -> None:
                 # duplicate user-facing cards. Keep them behind DEBUG_MODE.
                 if DEBUG_MODE:
                     await _ensure_agent_pty_event_tailer(convo_id)
-                    await _ensure_agent_pty_screen_event_tailer(convo_id)
-                    await _ensure_agent_pty_raw_event_tailer(convo_id)
                 # Do not mirror agent PTY block events into the transcript by default.
                 # The user-facing terminal "command cards" are derived from deterministic
                 # user-terminal markers + bytes slicing, and agent PTY begin/end events
@@ -2012,6 +2504,75 @@ async def _agent_pty_monitor_loop() -> None:
 #                            - Approvals                            - Commands, diffs, plans
 # =============================================================================
 
+# Exact (lowercased) labels handled by _route_appserver_event -> the branch that handles them.
+_APPSERVER_EVENT_ROUTES: Dict[str, str] = {
+    "thread/started": "thread_started",
+    "turn/started": "turn",
+    "turn/completed": "turn",
+    "turn/diff/updated": "diff",
+    "codex/event/turn_diff": "diff",
+    "codex/event/token_count": "token_usage",
+    "thread/tokenusage/updated": "token_usage",
+    "thread/compacted": "compacted",
+    "context_compacted": "compacted",
+    "codex/event/context_compacted": "compacted",
+    "codex/event/error": "error",
+    "error": "error",
+    "codex/event/warning": "warning",
+    "codex/event/item_started": "suppressed",
+    "codex/event/item_completed": "suppressed",
+    "codex/event/user_message": "suppressed",
+    "codex/event/task_complete": "suppressed",
+    "codex/event/task_started": "suppressed",
+    "codex/event/mcp_startup_complete": "suppressed",
+    "account/ratelimits/updated": "suppressed",
+    "codex/event/plan_update": "codex_plan_update",
+    "turn/plan/updated": "turn_plan_updated",
+    "item/started": "item_started",
+    "item/completed": "item_completed",
+    "item/agentmessage/delta": "agent_message_delta",
+    "item/reasoning/summarytextdelta": "reasoning_delta",
+    "item/reasoning/textdelta": "reasoning_delta",
+    "item/reasoning/summarypartadded": "reasoning_part_added",
+    "codex/event/agent_message_content_delta": "codex_agent_message_delta",
+    "codex/event/agent_message_delta": "codex_agent_message_delta",
+    "codex/event/agent_message": "codex_agent_message",
+    "codex/event/agent_reasoning_delta": "codex_reasoning_delta",
+    "codex/event/reasoning_content_delta": "codex_reasoning_delta",
+    "codex/event/reasoning_summary_delta": "codex_reasoning_delta",
+    "codex/event/agent_reasoning_section_break": "codex_reasoning_section_break",
+    "codex/event/agent_reasoning": "codex_agent_reasoning",
+    "exec_command_begin": "exec_command",
+    "exec_command_output_delta": "exec_command",
+    "exec_command_end": "exec_command",
+    "item/commandexecution/outputdelta": "command_output",
+    "item/commandexecution/terminalinteraction": "command_output",
+}
+
+
+@functools.lru_cache(maxsize=512)
+def _appserver_event_route(label_lower: str) -> Optional[str]:
+    """Branch of _route_appserver_event for a lowercased label (None: unhandled).
+
+    Approval substrings win over exact labels, and MCP / web search substrings are the last
+    resort, matching the order the router used to test them in. Memoized: the label set is small.
+    """
+    if "commandexecution/requestapproval" in label_lower:
+        return "command_approval"
+    if "filechange/requestapproval" in label_lower or "applypatchapproval" in label_lower:
+        return "diff_approval"
+    if "apply_patch_approval_request" in label_lower:
+        return "apply_patch_approval"
+    route = _APPSERVER_EVENT_ROUTES.get(label_lower)
+    if route is not None:
+        return route
+    if "mcp_tool_call_begin" in label_lower or "mcp_tool_call_end" in label_lower:
+        return "mcp_tool_call"
+    if "web_search_begin" in label_lower or "web_search_end" in label_lower:
+        return "web_search"
+    return None
+
+
 async def _route_appserver_event(
     label: Optional[str],
     payload: Any,
@@ -2040,26 +2601,37 @@ async def _route_appserver_event(
         convo_id = _find_conversation_by_thread_id(thread_id)
     
     # Fallback to active conversation only if thread_id lookup fails
+    # One lock-free config read per event, reused for the thread_id fallback below (unless
+    # _ensure_conversation changes the config in between).
+    cfg: Optional[Dict[str, Any]] = None
     if not convo_id:
-        async with _config_lock:
-            cfg = _load_appserver_config()
-            convo_id = cfg.get("conversation_id")
+        cfg = _peek_appserver_config()
+        convo_id = cfg.get("conversation_id")
     
     if not convo_id:
         convo_id = await _ensure_conversation()
+        cfg = None
     turn_id = _get_turn_id(payload)
     item_id = None
-    if isinstance(payload, dict):
+    payload_is_dict = isinstance(payload, dict)
+    if payload_is_dict:
         item_id = payload.get("itemId") or payload.get("item_id")
         if not item_id and isinstance(payload.get("item"), dict):
             item_id = payload["item"].get("id")
     if not thread_id:
-        thread_id = _load_appserver_config().get("thread_id")
+        thread_id = (cfg or _peek_appserver_config()).get("thread_id")
     state = _get_state_for_item(thread_id, turn_id, item_id)
     if thread_id:
         await _set_thread_id(thread_id)
 
     label_lower = label.lower()
+    route = _appserver_event_route(label_lower)
+    if route is None:
+        # No handler for this label
+        return convo_id, events
+    # Only the thread/turn lifecycle branches act on a non-dict payload; the rest can assume a dict.
+    if not payload_is_dict and route not in ("thread_started", "turn"):
+        return convo_id, events
 
     # -------------------------------------------------------------------------
     # SECTION: Approval Events (Frontend only - user interaction required)
@@ -2067,66 +2639,63 @@ async def _route_appserver_event(
     # These events require user interaction and are only sent to frontend.
     # Approval decisions are recorded to transcript separately via /approval_record.
     
-    if "commandexecution/requestapproval" in label_lower:
-        if isinstance(payload, dict):
-            item_id = payload.get("itemId") or payload.get("item_id") or payload.get("id")
-            if item_id and request_id is not None:
-                _approval_request_map[str(item_id)] = str(request_id)
-            resolved_id = request_id if request_id is not None else payload.get("_request_id")
-            if resolved_id is None and item_id:
-                resolved_id = _approval_request_map.get(str(item_id))
-            cached = _approval_item_cache.get(str(item_id)) if item_id else {}
-            events.append({
-                "type": "approval",
-                "kind": "command",
-                "id": resolved_id,
-                "payload": {
-                    "command": payload.get("command") or payload.get("parsedCmd") or payload.get("cmd") or cached.get("command"),
-                    "cwd": payload.get("cwd") or cached.get("cwd"),
-                    "reason": payload.get("reason"),
-                    "risk": payload.get("risk"),
-                },
-            })
-            events.append({"type": "activity", "label": "approval", "active": True})
+    if route == "command_approval":
+        item_id = payload.get("itemId") or payload.get("item_id") or payload.get("id")
+        if item_id and request_id is not None:
+            _lru_put(_approval_request_map, str(item_id), str(request_id), _APPROVAL_CACHE_MAX)
+        resolved_id = request_id if request_id is not None else payload.get("_request_id")
+        if resolved_id is None and item_id:
+            resolved_id = _approval_request_map.get(str(item_id))
+        cached = _approval_item_cache.get(str(item_id)) if item_id else {}
+        events.append({
+            "type": "approval",
+            "kind": "command",
+            "id": resolved_id,
+            "payload": {
+                "command": payload.get("command") or payload.get("parsedCmd") or payload.get("cmd") or cached.get("command"),
+                "cwd": payload.get("cwd") or cached.get("cwd"),
+                "reason": payload.get("reason"),
+                "risk": payload.get("risk"),
+            },
+        })
+        events.append({"type": "activity", "label": "approval", "active": True})
         return convo_id, events
 
     # Legacy apply_patch_approval_request - cache the diff by call_id for later approval
-    if "apply_patch_approval_request" in label_lower:
-        if isinstance(payload, dict):
-            call_id = payload.get("call_id")
-            changes = payload.get("changes")
-            if call_id and changes:
-                # Extract unified diff from changes dict
-                diff_parts = []
-                for path, change in changes.items():
-                    if isinstance(change, dict) and change.get("unified_diff"):
-                        diff_parts.append(f"--- {path}\n+++ {path}\n{change.get('unified_diff')}")
-                _approval_item_cache[str(call_id)] = {
-                    "diff": "\n".join(diff_parts) if diff_parts else None,
-                    "changes": changes,
-                }
+    if route in ("apply_patch_approval", "diff_approval") and "apply_patch_approval_request" in label_lower:
+        call_id = payload.get("call_id")
+        changes = payload.get("changes")
+        if call_id and changes:
+            # Extract unified diff from changes dict
+            diff_parts = []
+            for path, change in changes.items():
+                if isinstance(change, dict) and change.get("unified_diff"):
+                    diff_parts.append(f"--- {path}\n+++ {path}\n{change.get('unified_diff')}")
+            _lru_put(_approval_item_cache, str(call_id), {
+                "diff": "\n".join(diff_parts) if diff_parts else None,
+                "changes": changes,
+            }, _APPROVAL_CACHE_MAX)
         # Don't return - let it fall through to filechange/requestapproval handler if also matches
 
-    if "filechange/requestapproval" in label_lower or "applypatchapproval" in label_lower:
-        if isinstance(payload, dict):
-            item_id = payload.get("itemId") or payload.get("item_id") or payload.get("call_id") or payload.get("id")
-            if item_id and request_id is not None:
-                _approval_request_map[str(item_id)] = str(request_id)
-            resolved_id = request_id if request_id is not None else payload.get("_request_id")
-            if resolved_id is None and item_id:
-                resolved_id = _approval_request_map.get(str(item_id))
-            cached = _approval_item_cache.get(str(item_id)) if item_id else {}
-            events.append({
-                "type": "approval",
-                "kind": "diff",
-                "id": resolved_id,
-                "payload": {
-                    "diff": payload.get("diff") or payload.get("patch") or payload.get("unified_diff") or cached.get("diff"),
-                    "changes": payload.get("changes") or cached.get("changes"),
-                    "reason": payload.get("reason"),
-                },
-            })
-            events.append({"type": "activity", "label": "approval", "active": True})
+    if route == "diff_approval":
+        item_id = payload.get("itemId") or payload.get("item_id") or payload.get("call_id") or payload.get("id")
+        if item_id and request_id is not None:
+            _lru_put(_approval_request_map, str(item_id), str(request_id), _APPROVAL_CACHE_MAX)
+        resolved_id = request_id if request_id is not None else payload.get("_request_id")
+        if resolved_id is None and item_id:
+            resolved_id = _approval_request_map.get(str(item_id))
+        cached = _approval_item_cache.get(str(item_id)) if item_id else {}
+        events.append({
+            "type": "approval",
+            "kind": "diff",
+            "id": resolved_id,
+            "payload": {
+                "diff": payload.get("diff") or payload.get("patch") or payload.get("unified_diff") or cached.get("diff"),
+                "changes": payload.get("changes") or cached.get("changes"),
+                "reason": payload.get("reason"),
+            },
+        })
+        events.append({"type": "activity", "label": "approval", "active": True})
         return convo_id, events
 
     # -------------------------------------------------------------------------
@@ -2135,14 +2704,14 @@ async def _route_appserver_event(
     # Turn start/complete events update UI activity state and write status to
     # transcript for replay. Plans are accumulated during turn and written on complete.
     
-    if label_lower == "thread/started":
+    if route == "thread_started":
         # [Frontend] Activity indicator only
         events.append({"type": "activity", "label": "thread started", "active": True})
         # Best-effort: persist a "thread session marker" so a fresh frontend
         # can decide whether it must `thread/resume` for this conversation.
         try:
             # Try to extract thread id from payload if present.
-            thread_obj = payload.get("thread", {}) if isinstance(payload, dict) else {}
+            thread_obj = payload.get("thread", {}) if payload_is_dict else {}
             thread_id_from_event = (
                 thread_obj.get("id")
                 or payload.get("threadId")
@@ -2151,8 +2720,7 @@ async def _route_appserver_event(
             )
             if isinstance(thread_id_from_event, str) and thread_id_from_event:
                 await _set_thread_id(thread_id_from_event)
-            async with _config_lock:
-                cfg = _load_appserver_config()
+            cfg = _peek_appserver_config()
             shell_id = cfg.get("shell_id")
             convo_id_local = cfg.get("conversation_id")
             if (
@@ -2174,14 +2742,14 @@ async def _route_appserver_event(
             pass
         return convo_id, events
 
-    if label_lower in {"turn/started", "turn/completed"}:
+    if route == "turn":
         if label_lower == "turn/started":
             await _set_turn_id(turn_id)
         else:
             await _set_turn_id(None)
-            state["thought_buffer"] = ""
+            state.thought_buffer = ""
             # Determine turn status from payload
-            turn_obj = payload.get("turn", {}) if isinstance(payload, dict) else {}
+            turn_obj = payload.get("turn", {}) if payload_is_dict else {}
             turn_status = turn_obj.get("status", "completed")  # completed, interrupted, failed, inProgress
             turn_error = turn_obj.get("error")
             # Map to ribbon status
@@ -2208,7 +2776,7 @@ async def _route_appserver_event(
                 "error": turn_error,
             })
             # On turn completion, write accumulated plan to transcript if any steps exist
-            plan_steps = state.get("plan_steps", [])
+            plan_steps = state.plan_steps
             if plan_steps and convo_id:
                 await _append_transcript_entry(convo_id, {
                     "role": "plan",
@@ -2222,7 +2790,8 @@ async def _route_appserver_event(
                     "steps": plan_steps,
                 })
             # Clear plan state for next turn
-            state["plan_steps"] = []
+            state.plan_steps = []
+            _request_transcript_flush()
         events.append({"type": "activity", "label": "turn started" if label_lower == "turn/started" else "idle", "active": label_lower == "turn/started"})
         return convo_id, events
 
@@ -2232,14 +2801,7 @@ async def _route_appserver_event(
     # Unified diffs are emitted to frontend for display and written to transcript
     # for replay. We dedupe diffs to avoid showing the same change multiple times.
     
-    if label_lower == "turn/diff/updated" and isinstance(payload, dict):
-        diff, path = _extract_diff_with_path(payload)
-        if diff:
-            # [Frontend] diff event + [Transcript] for replay
-            await _emit_diff_event(state, diff, convo_id, thread_id, turn_id, item_id, events, path=path)
-        return convo_id, events
-
-    if label_lower == "codex/event/turn_diff" and isinstance(payload, dict):
+    if route == "diff":
         diff, path = _extract_diff_with_path(payload)
         if diff:
             # [Frontend] diff event + [Transcript] for replay
@@ -2251,7 +2813,7 @@ async def _route_appserver_event(
     # -------------------------------------------------------------------------
     # Token counts update the context window display and are saved for replay.
     
-    if label_lower in {"codex/event/token_count", "thread/tokenusage/updated"} and isinstance(payload, dict):
+    if route == "token_usage":
         total = None
         input_tokens = None
         cached_input_tokens = None
@@ -2318,7 +2880,7 @@ async def _route_appserver_event(
         return convo_id, events
 
     # Context compacted event - agent dropped some history to fit context window
-    if label_lower in {"thread/compacted", "context_compacted", "codex/event/context_compacted"} and isinstance(payload, dict):
+    if route == "compacted":
         thread_id_compact = payload.get("threadId") or payload.get("thread_id") or thread_id
         turn_id_compact = payload.get("turnId") or payload.get("turn_id") or turn_id
         # [Transcript] Record compaction event
@@ -2329,6 +2891,7 @@ async def _route_appserver_event(
                 "turn_id": turn_id_compact,
                 "event": label_lower,
             })
+            _request_transcript_flush()
         # [Frontend] Notify user that context was compacted
         events.append({
             "type": "context_compacted",
@@ -2342,7 +2905,7 @@ async def _route_appserver_event(
     # SECTION: Error/Warning Events (Frontend + Transcript for Replay)
     # -------------------------------------------------------------------------
     
-    if label_lower in {"codex/event/error", "error"} and isinstance(payload, dict):
+    if route == "error":
         error_obj = payload.get("error") or payload
         message = error_obj.get("message") or str(error_obj)
         # [Transcript] Store for replay
@@ -2352,6 +2915,7 @@ async def _route_appserver_event(
                 "text": message,
                 "event": label_lower,
             })
+            _request_transcript_flush()
         # [Frontend] Error display
         events.append({
             "type": "error",
@@ -2360,7 +2924,7 @@ async def _route_appserver_event(
         events.append({"type": "activity", "label": "error", "active": False})
         return convo_id, events
 
-    if label_lower == "codex/event/warning" and isinstance(payload, dict):
+    if route == "warning":
         # [Frontend only] Warnings not persisted to transcript
         message = payload.get("message") or payload.get("msg", {}).get("message") or ""
         if message:
@@ -2375,15 +2939,7 @@ async def _route_appserver_event(
     # -------------------------------------------------------------------------
     # These events are noisy or redundant - we handle their data elsewhere.
     
-    if label_lower in {
-        "codex/event/item_started",
-        "codex/event/item_completed",
-        "codex/event/user_message",
-        "codex/event/task_complete",
-        "codex/event/task_started",
-        "codex/event/mcp_startup_complete",
-        "account/ratelimits/updated",
-    }:
+    if route == "suppressed":
         return convo_id, events
 
     # -------------------------------------------------------------------------
@@ -2392,7 +2948,7 @@ async def _route_appserver_event(
     # Plan updates stream to frontend for live overlay. Full plan is written to
     # transcript on turn/completed for replay.
     
-    if label_lower == "codex/event/plan_update" and isinstance(payload, dict):
+    if route == "codex_plan_update":
         plan_steps = payload.get("plan")
         if isinstance(plan_steps, list):
             normalized_steps = []
@@ -2411,10 +2967,10 @@ async def _route_appserver_event(
                             "step": step,
                             "status": status or "pending",
                         })
-            state["plan_steps"] = normalized_steps
+            state.plan_steps = normalized_steps
         return convo_id, events
 
-    if label_lower == "turn/plan/updated" and isinstance(payload, dict):
+    if route == "turn_plan_updated":
         # [Frontend] Live overlay + accumulate for [Transcript] on turn/completed
         plan_steps = payload.get("plan")
         if isinstance(plan_steps, list):
@@ -2438,7 +2994,7 @@ async def _route_appserver_event(
                             "step": step,
                             "status": normalized_status or "pending",
                         })
-            state["plan_steps"] = normalized_steps
+            state.plan_steps = normalized_steps
         return convo_id, events
 
     # -------------------------------------------------------------------------
@@ -2448,7 +3004,7 @@ async def _route_appserver_event(
     # - Deltas stream to frontend for live display
     # - Complete items written to transcript for replay
     
-    if label_lower == "item/started" and isinstance(payload, dict):
+    if route == "item_started":
         item = payload.get("item") if isinstance(payload.get("item"), dict) else payload
         item_type = str(item.get("type") or "").lower() if isinstance(item, dict) else ""
         
@@ -2474,9 +3030,9 @@ async def _route_appserver_event(
             
         if item_type == "reasoning":
             # Track state for delta accumulation
-            state["reason_source"] = state["reason_source"] or "item"
+            state.reason_source = state.reason_source or "item"
             if item.get("id"):
-                state["reasoning_id"] = item.get("id")
+                state.reasoning_id = item.get("id")
                 _register_item_state(item.get("id"), state)
             return convo_id, events
             
@@ -2484,11 +3040,11 @@ async def _route_appserver_event(
             # Cache diff info for approval - actual diff emitted via turn_diff
             diff, path = _extract_diff_with_path(item)
             if item.get("id"):
-                _approval_item_cache[str(item.get("id"))] = {
+                _lru_put(_approval_item_cache, str(item.get("id")), {
                     "diff": diff,
                     "changes": item.get("changes"),
                     "path": path,
-                }
+                }, _APPROVAL_CACHE_MAX)
             return convo_id, events
             
         if item_type == "commandexecution":
@@ -2497,11 +3053,11 @@ async def _route_appserver_event(
             cwd = item.get("cwd") or ""
             tool_id = _tool_event_id(label_lower, item, thread_id, turn_id)
             if item.get("id"):
-                _approval_item_cache[str(item.get("id"))] = {
+                _lru_put(_approval_item_cache, str(item.get("id")), {
                     "command": command,
                     "cwd": cwd,
                     "tool_id": tool_id,
-                }
+                }, _APPROVAL_CACHE_MAX)
             # [Frontend] Tool begin for command execution (creates tool:command row for streaming)
             events.append({
                 "type": "tool_begin",
@@ -2514,14 +3070,14 @@ async def _route_appserver_event(
             
         if item_type in {"agentmessage", "assistantmessage", "assistant"}:
             # Track state for delta accumulation
-            state["msg_source"] = state["msg_source"] or "item"
+            state.msg_source = state.msg_source or "item"
             if item.get("id"):
-                state["assistant_id"] = item.get("id")
+                state.assistant_id = item.get("id")
                 _register_item_state(item.get("id"), state)
-            state["assistant_started"] = True
+            state.assistant_started = True
             return convo_id, events
 
-    if label_lower == "item/completed" and isinstance(payload, dict):
+    if route == "item_completed":
         item = payload.get("item") if isinstance(payload.get("item"), dict) else payload
         item_type = str(item.get("type") or "").lower() if isinstance(item, dict) else ""
         
@@ -2536,8 +3092,8 @@ async def _route_appserver_event(
                     "event": "item/completed",
                 })
             # [Frontend] Finalize streaming message
-            if state.get("msg_source") in {None, "item"} and state.get("assistant_started"):
-                events.append({"type": "assistant_finalize", "id": item.get("id") or state.get("assistant_id") or "assistant", "text": entry["text"] if entry else item.get("text")})
+            if state.msg_source in {None, "item"} and state.assistant_started:
+                events.append({"type": "assistant_finalize", "id": item.get("id") or state.assistant_id or "assistant", "text": entry["text"] if entry else item.get("text")})
             events.append({"type": "activity", "label": "idle", "active": False})
             return convo_id, events
             
@@ -2561,23 +3117,23 @@ async def _route_appserver_event(
                     "event": "item/completed",
                 })
             # [Frontend] Finalize streaming reasoning (scrubbed)
-            if state.get("reason_source") in {None, "item"} and state.get("reasoning_started"):
-                events.append({"type": "reasoning_finalize", "id": item.get("id") or state.get("reasoning_id") or "reasoning", "text": scrubbed_text})
-                state["reasoning_started"] = False
-                state["reasoning_buffer"] = ""
-                state["reasoning_id"] = None
-            state["thought_buffer"] = ""
+            if state.reason_source in {None, "item"} and state.reasoning_started:
+                events.append({"type": "reasoning_finalize", "id": item.get("id") or state.reasoning_id or "reasoning", "text": scrubbed_text})
+                state.reasoning_started = False
+                state.reasoning_buffer = ""
+                state.reasoning_id = None
+            state.thought_buffer = ""
             return convo_id, events
             
         if item_type == "filechange":
             # Cache for approval tracking - diff emitted via turn_diff
             diff, path = _extract_diff_with_path(item)
             if item.get("id") and diff:
-                _approval_item_cache[str(item.get("id"))] = {
+                _lru_put(_approval_item_cache, str(item.get("id")), {
                     "diff": diff,
                     "changes": item.get("changes"),
                     "path": path,
-                }
+                }, _APPROVAL_CACHE_MAX)
             return convo_id, events
             
         if item_type == "commandexecution":
@@ -2586,7 +3142,7 @@ async def _route_appserver_event(
             output = item.get("aggregatedOutput") or item.get("output") or item.get("stdout") or ""
             exit_code = item.get("exitCode") if item.get("exitCode") is not None else item.get("exit_code")
             duration_ms = item.get("durationMs") if item.get("durationMs") is not None else item.get("duration_ms")
-            if isinstance(output, str):
+            if isinstance(output, str) and "\r" in output:
                 output = output.replace("\r\n", "\n").replace("\r", "\n")
             
             # Get tool_id from cache (set in item/started)
@@ -2599,7 +3155,7 @@ async def _route_appserver_event(
                 "id": tool_id,
                 "tool": "command",
                 "arguments": {"command": command, "cwd": cwd},
-                "result": {"exit_code": exit_code, "output_lines": len(output.split('\n')) if output else 0},
+                "result": {"exit_code": exit_code, "output_lines": output.count('\n') + 1 if output else 0},
                 "duration_ms": duration_ms,
                 "is_error": exit_code not in (None, 0),
             })
@@ -2638,15 +3194,15 @@ async def _route_appserver_event(
     # Complete content is persisted on item/completed, not during streaming.
     
     # --- Assistant Message Deltas ---
-    if label_lower == "item/agentmessage/delta" and isinstance(payload, dict):
+    if route == "agent_message_delta":
         # [Frontend] Stream text delta
-        if state["msg_source"] in {None, "item"}:
-            state["msg_source"] = "item"
-            item_id = payload.get("itemId") or payload.get("id") or state.get("assistant_id") or "assistant"
+        if state.msg_source in {None, "item"}:
+            state.msg_source = "item"
+            item_id = payload.get("itemId") or payload.get("id") or state.assistant_id or "assistant"
             if item_id:
-                state["assistant_id"] = item_id
+                state.assistant_id = item_id
                 _register_item_state(item_id, state)
-            state["assistant_started"] = True
+            state.assistant_started = True
             delta = payload.get("delta")
             if isinstance(delta, str) and delta:
                 events.append({"type": "assistant_delta", "id": item_id, "delta": delta})
@@ -2654,18 +3210,18 @@ async def _route_appserver_event(
         return convo_id, events
 
     # --- Reasoning Deltas ---
-    if label_lower in {"item/reasoning/summarytextdelta", "item/reasoning/textdelta"} and isinstance(payload, dict):
+    if route == "reasoning_delta":
         # [Frontend] Stream reasoning delta
-        if state["reason_source"] in {None, "item"}:
-            state["reason_source"] = "item"
-            item_id = payload.get("itemId") or payload.get("id") or state.get("reasoning_id") or "reasoning"
+        if state.reason_source in {None, "item"}:
+            state.reason_source = "item"
+            item_id = payload.get("itemId") or payload.get("id") or state.reasoning_id or "reasoning"
             if item_id:
-                state["reasoning_id"] = item_id
+                state.reasoning_id = item_id
                 _register_item_state(item_id, state)
-            state["reasoning_started"] = True
+            state.reasoning_started = True
             delta = payload.get("delta")
             if isinstance(delta, str):
-                state["reasoning_buffer"] = state.get("reasoning_buffer", "") + delta
+                state.reasoning_buffer += delta
                 # Extract thought titles from reasoning and show in status ribbon
                 scrubbed_delta, thoughts = _extract_and_scrub_thoughts_stream(delta, state)
                 for thought in thoughts:
@@ -2679,36 +3235,36 @@ async def _route_appserver_event(
                     events.append({"type": "activity", "label": "reasoning", "active": True})
         return convo_id, events
 
-    if label_lower == "item/reasoning/summarypartadded" and isinstance(payload, dict):
+    if route == "reasoning_part_added":
         # [Frontend] Reasoning section break
-        if state["reason_source"] in {None, "item"}:
-            state["reason_source"] = "item"
-            item_id = payload.get("itemId") or payload.get("id") or state.get("reasoning_id") or "reasoning"
+        if state.reason_source in {None, "item"}:
+            state.reason_source = "item"
+            item_id = payload.get("itemId") or payload.get("id") or state.reasoning_id or "reasoning"
             if item_id:
-                state["reasoning_id"] = item_id
+                state.reasoning_id = item_id
                 _register_item_state(item_id, state)
-            state["reasoning_started"] = True
-            state["reasoning_buffer"] = state.get("reasoning_buffer", "") + "\n"
+            state.reasoning_started = True
+            state.reasoning_buffer += "\n"
             events.append({"type": "reasoning_delta", "id": item_id, "delta": "\n"})
         return convo_id, events
 
     # --- Legacy Codex Event Deltas (alternate protocol) ---
-    if label_lower in {"codex/event/agent_message_content_delta", "codex/event/agent_message_delta"} and isinstance(payload, dict):
+    if route == "codex_agent_message_delta":
         # [Frontend] Stream text delta (legacy format)
-        if state["msg_source"] in {None, "codex"}:
-            state["msg_source"] = "codex"
-            item_id = payload.get("item_id") or payload.get("itemId") or state.get("assistant_id") or "assistant"
+        if state.msg_source in {None, "codex"}:
+            state.msg_source = "codex"
+            item_id = payload.get("item_id") or payload.get("itemId") or state.assistant_id or "assistant"
             if item_id:
-                state["assistant_id"] = item_id
+                state.assistant_id = item_id
                 _register_item_state(item_id, state)
-            state["assistant_started"] = True
+            state.assistant_started = True
             delta = payload.get("delta")
             if isinstance(delta, str) and delta:
                 events.append({"type": "assistant_delta", "id": item_id, "delta": delta})
                 events.append({"type": "activity", "label": "responding", "active": True})
         return convo_id, events
 
-    if label_lower == "codex/event/agent_message" and isinstance(payload, dict):
+    if route == "codex_agent_message":
         # [Transcript] + [Frontend] Complete message (legacy format)
         text = payload.get("message") or payload.get("text")
         if isinstance(text, str):
@@ -2719,22 +3275,22 @@ async def _route_appserver_event(
                     "item_id": payload.get("item_id") or payload.get("itemId"),
                     "event": "agent_message",
                 })
-            if state.get("msg_source") in {None, "codex"} and state.get("assistant_started"):
-                events.append({"type": "assistant_finalize", "id": payload.get("item_id") or payload.get("itemId") or state.get("assistant_id") or "assistant", "text": text.strip()})
+            if state.msg_source in {None, "codex"} and state.assistant_started:
+                events.append({"type": "assistant_finalize", "id": payload.get("item_id") or payload.get("itemId") or state.assistant_id or "assistant", "text": text.strip()})
         return convo_id, events
 
-    if label_lower in {"codex/event/agent_reasoning_delta", "codex/event/reasoning_content_delta", "codex/event/reasoning_summary_delta"} and isinstance(payload, dict):
+    if route == "codex_reasoning_delta":
         # [Frontend] Stream reasoning delta (legacy format)
-        if state["reason_source"] in {None, "codex"}:
-            state["reason_source"] = "codex"
-            item_id = payload.get("item_id") or payload.get("itemId") or state.get("reasoning_id") or "reasoning"
+        if state.reason_source in {None, "codex"}:
+            state.reason_source = "codex"
+            item_id = payload.get("item_id") or payload.get("itemId") or state.reasoning_id or "reasoning"
             if item_id:
-                state["reasoning_id"] = item_id
+                state.reasoning_id = item_id
                 _register_item_state(item_id, state)
-            state["reasoning_started"] = True
+            state.reasoning_started = True
             delta = payload.get("delta")
             if isinstance(delta, str):
-                state["reasoning_buffer"] = state.get("reasoning_buffer", "") + delta
+                state.reasoning_buffer += delta
                 # Extract thought titles from reasoning and show in status ribbon
                 scrubbed_delta, thoughts = _extract_and_scrub_thoughts_stream(delta, state)
                 for thought in thoughts:
@@ -2748,20 +3304,20 @@ async def _route_appserver_event(
                     events.append({"type": "activity", "label": "reasoning", "active": True})
         return convo_id, events
 
-    if label_lower == "codex/event/agent_reasoning_section_break" and isinstance(payload, dict):
+    if route == "codex_reasoning_section_break":
         # [Frontend] Reasoning section break (legacy format)
-        if state["reason_source"] in {None, "codex"}:
-            state["reason_source"] = "codex"
-            item_id = payload.get("item_id") or payload.get("itemId") or state.get("reasoning_id") or "reasoning"
+        if state.reason_source in {None, "codex"}:
+            state.reason_source = "codex"
+            item_id = payload.get("item_id") or payload.get("itemId") or state.reasoning_id or "reasoning"
             if item_id:
-                state["reasoning_id"] = item_id
+                state.reasoning_id = item_id
                 _register_item_state(item_id, state)
-            state["reasoning_started"] = True
-            state["reasoning_buffer"] = state.get("reasoning_buffer", "") + "\n\n"
+            state.reasoning_started = True
+            state.reasoning_buffer += "\n\n"
             events.append({"type": "reasoning_delta", "id": item_id, "delta": "\n\n"})
         return convo_id, events
 
-    if label_lower == "codex/event/agent_reasoning" and isinstance(payload, dict):
+    if route == "codex_agent_reasoning":
         # [Frontend] Finalize reasoning (legacy format)
         text = payload.get("text") or payload.get("message")
         # Scrub thought titles from complete reasoning text
@@ -2769,12 +3325,12 @@ async def _route_appserver_event(
         # Emit thought titles to ribbon (smooth transition for mid-stream conversation switch)
         for thought in thoughts:
             events.append({"type": "thought", "text": thought})
-        if state.get("reason_source") in {None, "codex"} and state.get("reasoning_started"):
-            events.append({"type": "reasoning_finalize", "id": payload.get("item_id") or payload.get("itemId") or state.get("reasoning_id") or "reasoning", "text": scrubbed_text})
-            state["reasoning_started"] = False
-            state["reasoning_buffer"] = ""
-            state["reasoning_id"] = None
-        state["thought_buffer"] = ""
+        if state.reason_source in {None, "codex"} and state.reasoning_started:
+            events.append({"type": "reasoning_finalize", "id": payload.get("item_id") or payload.get("itemId") or state.reasoning_id or "reasoning", "text": scrubbed_text})
+            state.reasoning_started = False
+            state.reasoning_buffer = ""
+            state.reasoning_id = None
+        state.thought_buffer = ""
         return convo_id, events
 
     # -------------------------------------------------------------------------
@@ -2783,7 +3339,7 @@ async def _route_appserver_event(
     # Command output deltas stream to frontend. Complete output is captured
     # on item/completed for transcript.
     
-    if label_lower in {"exec_command_begin", "exec_command_output_delta", "exec_command_end"} and isinstance(payload, dict):
+    if route == "exec_command":
         # Legacy protocol - activity indicators only
         if label_lower == "exec_command_begin":
             events.append({"type": "activity", "label": "running command", "active": True})
@@ -2791,7 +3347,7 @@ async def _route_appserver_event(
             events.append({"type": "activity", "label": "processing", "active": True})
         return convo_id, events
 
-    if label_lower in {"item/commandexecution/outputdelta", "item/commandexecution/terminalinteraction"} and isinstance(payload, dict):
+    if route == "command_output":
         # [Frontend] Stream command output deltas
         tool_id = _tool_event_id(label_lower, payload, thread_id, turn_id)
         if label_lower.endswith("outputdelta"):
@@ -2816,7 +3372,7 @@ async def _route_appserver_event(
             })
         return convo_id, events
 
-    if ("mcp_tool_call_begin" in label_lower or "mcp_tool_call_end" in label_lower) and isinstance(payload, dict):
+    if route == "mcp_tool_call":
         # [Frontend + Transcript] MCP tool call begin/end
         # payload might be params wrapper with 'msg' inside, or the msg itself
         msg = payload.get("msg") if isinstance(payload.get("msg"), dict) else payload
@@ -2907,7 +3463,7 @@ async def _route_appserver_event(
                 })
         return convo_id, events
 
-    if ("web_search_begin" in label_lower or "web_search_end" in label_lower) and isinstance(payload, dict):
+    if route == "web_search":
         # [Frontend + Transcript] Web search begin/end
         # payload might be params wrapper with 'msg' inside, or the msg itself
         msg = payload.get("msg") if isinstance(payload.get("msg"), dict) else payload
@@ -3130,7 +3686,7 @@ async def _auto_resume_and_retry(thread_id: str, original_payload: Dict[str, Any
     """
     try:
         # Build thread/resume request
-        resume_id = int(datetime.now(timezone.utc).timestamp() * 1000)
+        resume_id = time.time_ns() // 1_000_000
         resume_payload: Dict[str, Any] = {
             "id": resume_id,
             "method": "thread/resume",
@@ -3156,7 +3712,7 @@ async def _auto_resume_and_retry(thread_id: str, original_payload: Dict[str, Any
         await asyncio.sleep(0.5)
         
         # Re-send original turn/start with a new request ID
-        retry_id = int(datetime.now(timezone.utc).timestamp() * 1000) + 1
+        retry_id = time.time_ns() // 1_000_000 + 1
         retry_payload = original_payload.copy()
         retry_payload["id"] = retry_id
         
@@ -4171,6 +4727,7 @@ async def api_appserver_conversation_select(payload: Dict[str, Any] = Body(...))
         if prev_meta.get("status") == "draft" and not prev_meta.get("thread_id"):
             # Previous conversation was a draft with no thread - delete it using same logic as DELETE endpoint
             prev_path = _conversation_dir(prev_convo_id)
+            _forget_conversation_meta(prev_convo_id)
             if prev_path.exists():
                 for child in prev_path.glob("**/*"):
                     if child.is_file():
@@ -4242,6 +4799,7 @@ async def api_appserver_conversation_delete(conversation_id: str):
         raise HTTPException(status_code=400, detail="Missing conversation_id")
     convo_id = _sanitize_conversation_id(conversation_id)
     path = _conversation_dir(convo_id)
+    _forget_conversation_meta(convo_id)
     # Remove sidecar directory if it exists
     if path.exists():
         for child in path.glob("**/*"):
@@ -4414,6 +4972,7 @@ async def api_appserver_transcript(conversation_id: Optional[str] = Query(None))
         convo_id = conversation_id or cfg.get("conversation_id")
     if not convo_id:
         return {"conversation_id": None, "items": []}
+    await _flush_transcript_entries()
     path = _transcript_path(str(convo_id))
     if not path.exists():
         return {"conversation_id": str(convo_id), "items": []}
@@ -4445,13 +5004,13 @@ async def api_appserver_transcript_range(
         convo_id = conversation_id or cfg.get("conversation_id")
     if not convo_id:
         return {"conversation_id": None, "total": 0, "offset": 0, "items": []}
+    await _flush_transcript_entries()
     path = _transcript_path(str(convo_id))
     if not path.exists():
         return {"conversation_id": str(convo_id), "total": 0, "offset": 0, "items": []}
     total = 0
     items: List[Dict[str, Any]] = []
     if offset < 0:
-        from collections import deque
         buf: deque = deque(maxlen=limit)
         with path.open("r", encoding="utf-8") as f:
             for line in f:
@@ -4802,7 +5361,7 @@ async def api_appserver_message(payload: AppserverMessageIn):
     thread_id = meta.get("thread_id")
     
     # Generate request IDs
-    base_id = int(datetime.now(timezone.utc).timestamp() * 1000)
+    base_id = time.time_ns() // 1_000_000
     
     # Helper to inject settings into params
     def inject_settings(params: Dict[str, Any], method: str) -> Dict[str, Any]:
@@ -5041,7 +5600,7 @@ async def api_appserver_shell_exec(payload: Dict[str, Any] = Body(...)):
     convo_id = cfg.get("conversation_id")
     
     # Generate tracking ID for streaming
-    call_id = f"shell_{int(datetime.now(timezone.utc).timestamp() * 1000)}"
+    call_id = f"shell_{time.time_ns() // 1_000_000}"
     
     # Emit shell_begin immediately so frontend can create streaming row
     await _broadcast_appserver_ui({
@@ -5448,7 +6007,7 @@ async def api_appserver_initialize():
 
 
 async def _rpc_request(method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 6.0) -> Dict[str, Any]:
-    req_id = str(int(datetime.now(timezone.utc).timestamp() * 1000))
+    req_id = str(time.time_ns() // 1_000_000)
     future: asyncio.Future = asyncio.get_event_loop().create_future()
     _appserver_rpc_waiters[req_id] = future
     payload = {"id": int(req_id), "method": method}
@@ -5490,7 +6049,7 @@ async def api_appserver_models():
 
 @app.get("/api/appserver/debug/raw")
 async def api_appserver_debug_raw(limit: int = Query(200, gt=0, le=500)):
-    return {"items": _appserver_raw_buffer[-limit:]}
+    return {"items": list(_appserver_raw_buffer)[-limit:]}
 
 
 @app.get("/api/appserver/debug/state")
@@ -5706,18 +6265,15 @@ async def appserver_ws(websocket: WebSocket):
     await websocket.accept()
     mode = websocket.query_params.get("mode", "ui")
     if mode == "raw":
-        _appserver_ws_clients_raw.append(websocket)
+        _appserver_ws_clients_raw.add(websocket)
     else:
-        _appserver_ws_clients_ui.append(websocket)
+        _appserver_ws_clients_ui.add(websocket)
     try:
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        with suppress(Exception):
-            if websocket in _appserver_ws_clients_ui:
-                _appserver_ws_clients_ui.remove(websocket)
-            if websocket in _appserver_ws_clients_raw:
-                _appserver_ws_clients_raw.remove(websocket)
+        _appserver_ws_clients_ui.discard(websocket)
+        _appserver_ws_clients_raw.discard(websocket)
 
 
 @app.websocket("/ws/pty/{conversation_id}")
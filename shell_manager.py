@@ -128,7 +128,8 @@ __FWS_IN_MARKER=0
 __FWS_READY=0
 __FWS_MANUAL="${__FWS_MANUAL:-0}"
 
-__fws_b64() { printf %s "$1" | base64 | tr -d '\n'; }
+# GNU/toybox base64 can disable wrapping itself (-w0); keep the tr pipeline for BSD base64.
+__fws_b64() { printf %s "$1" | base64 -w0 2>/dev/null || printf %s "$1" | base64 | tr -d '\n'; }
 __fws_now_ms() {
   date +%s%3N 2>/dev/null && return 0
   python - <<'PY'
@@ -136,6 +137,15 @@ import time
 print(int(time.time() * 1000))
 PY
 }
+# Fork-free timestamp: sets __FWS_NOW_MS from bash 5's $EPOCHREALTIME (falls back to __fws_now_ms).
+__fws_stamp_ms() {
+  if [ -n "${EPOCHREALTIME:-}" ]; then
+    local t="${EPOCHREALTIME/[.,]/}"
+    __FWS_NOW_MS="${t%???}"
+  else
+    __FWS_NOW_MS="$(__fws_now_ms)"
+  fi
+}
 
 __fws_emit_begin() {
   local cmd="$1"
@@ -156,20 +166,20 @@ __fws_emit_end() {
 
 __fws_emit_prompt() {
   local exit_code="${1:-$?}"
-  local ts="$(__fws_now_ms)"
+  __fws_stamp_ms
+  local ts="$__FWS_NOW_MS"
   local cwd="$(pwd -P 2>/dev/null || pwd)"
   local cwd_b64="$(__fws_b64 "$cwd")"
   printf '\n__FWS_PROMPT__ ts=%s cwd_b64=%s exit=%s\n' "$ts" "$cwd_b64" "$exit_code" >&3
 }
 
 __fws_should_ignore_cmd() {
-  local cmd="$1"
-  case "$cmd" in
-    PS1=*|PROMPT_COMMAND=*|__FWS_READY=*|__FWS_SEQ=*|__FWS_LAST_SEQ=*|__FWS_IN_MARKER=*|trap*|shopt*|set\ +o*|set\ -o*)
-      return 0
-      ;;
-    *__FWS_BLOCK_BEGIN__*|*__FWS_BLOCK_END__*|*__FWS_PROMPT__*) return 0 ;;
+  # Runs from the DEBUG trap for every command: test the most common internal noise first.
+  # (__FWS_* also covers the __FWS_READY=/__FWS_SEQ=/__FWS_IN_MARKER= assignments.)
+  case "$1" in
     __fws_*|__FWS_*) return 0 ;;
+    *__FWS_BLOCK_BEGIN__*|*__FWS_BLOCK_END__*|*__FWS_PROMPT__*) return 0 ;;
+    PS1=*|PROMPT_COMMAND=*|trap*|shopt*|set\ +o*|set\ -o*) return 0 ;;
   esac
   return 1
 }
@@ -192,7 +202,8 @@ else
     __FWS_IN_MARKER=1
     __FWS_SEQ=$((__FWS_SEQ + 1))
     __FWS_LAST_SEQ="$__FWS_SEQ"
-    local ts="$(__fws_now_ms)"
+    __fws_stamp_ms
+    local ts="$__FWS_NOW_MS"
     local cwd="$(pwd -P 2>/dev/null || pwd)"
     __fws_emit_begin "$cmd" "$cwd" "$ts" "$__FWS_SEQ"
     __FWS_IN_MARKER=0
@@ -205,7 +216,8 @@ else
       return 0
     fi
     local ec="$?"
-    __fws_emit_end "$ec" "$(__fws_now_ms)" "$__FWS_LAST_SEQ"
+    __fws_stamp_ms
+    __fws_emit_end "$ec" "$__FWS_NOW_MS" "$__FWS_LAST_SEQ"
     __fws_emit_prompt "$ec"
   }
   PROMPT_COMMAND="__fws_precmd"
@@ -218,7 +230,16 @@ fi
 PS1='\[\e[0;32m\]\w\[\e[0m\] \[\e[0;97m\]\$\[\e[0m\] '
 """
     content = content.replace("__FWS_MARKER_FILE_PATH__", str(marker_path))
-    path.write_text(content, encoding="utf-8")
+    data = content.encode("utf-8")
+    # Restarts re-run ensure for the same conversation; leave an identical rcfile alone.
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return
+    except OSError:
+        pass
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
 
 
 CONFIG_PATH = Path(os.path.expanduser("~/.cache/app_server/shell_manager.json"))